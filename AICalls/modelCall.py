@@ -1,11 +1,22 @@
 import os
+import re
+import sys
 import time
-from openai import OpenAI, RateLimitError, APITimeoutError, InternalServerError
-from typing import List
+import random
+import asyncio
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APITimeoutError, InternalServerError
+from typing import Callable, Dict, List, AsyncIterator, Tuple
 from dotenv import load_dotenv
 from pathlib import Path
 import httpx
 
+# Ensure project root is on sys.path so the sibling AICalls modules can be imported
+project_root = str(Path(__file__).parents[1])
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from AICalls.tokens import count_tokens, truncate_to_tokens
+
 # Load the environment variables from .env file
 env_path = Path(__file__).parent.parent / 'BackEnd' / '.env'
 load_dotenv(env_path)
@@ -23,6 +34,176 @@ client = OpenAI(
     max_retries=2
 )
 
+MODEL_NAME = "moonshotai/Kimi-K2-Thinking:novita"
+
+# Connection pool limits for the shared async client (many in-flight completions per process)
+MODEL_MAX_CONNECTIONS = int(os.getenv("MODEL_MAX_CONNECTIONS", "200"))
+MODEL_MAX_KEEPALIVE = int(os.getenv("MODEL_MAX_KEEPALIVE", "50"))
+
+# HTTP/2 needs the optional 'h2' package (pip install httpx[http2]); fall back to HTTP/1.1 without it
+try:
+    import h2  # noqa: F401
+    _http2_available = True
+except ImportError:
+    _http2_available = False
+
+# Async client sharing one pooled HTTP connection set across all requests
+async_client = AsyncOpenAI(
+    base_url="https://router.huggingface.co/v1",
+    api_key=hf_token,
+    max_retries=2,
+    http_client=httpx.AsyncClient(
+        http2=_http2_available,
+        timeout=httpx.Timeout(120.0, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=MODEL_MAX_CONNECTIONS,
+            max_keepalive_connections=MODEL_MAX_KEEPALIVE
+        )
+    )
+)
+
+
+async def aclose() -> None:
+    """Close the pooled async client and its connections (call once at shutdown)."""
+    await async_client.close()
+
+
+# Token budgets for each part of the prompt (the user's question itself is never cut)
+PROMPT_INSTRUCTION_TOKENS = int(os.getenv("PROMPT_INSTRUCTION_TOKENS", "400"))
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "1500"))
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "4096"))
+
+SYSTEM_INSTRUCTIONS = "You are a helpful AI tutor. Use the following context from the uploaded documents to answer the user's question. If the context doesn't contain relevant information, say so."
+HISTORY_INSTRUCTIONS = "Use this conversation history to provide contextually relevant responses."
+HISTORY_OMITTED_NOTE = "[Earlier messages omitted]"
+
+# Turns in a formatted history start with "User: " or "Assistant: " after a blank line
+_TURN_SPLIT = re.compile(r"\n\n(?=(?:User|Assistant): )")
+
+
+def _fit_history(conversation_history: str, budget: int) -> Tuple[str, int]:
+    """
+    Keep the most recent turns of a formatted conversation that fit in `budget` tokens.
+
+    Oldest turns are dropped first; if even the newest turn is too long, its beginning is kept.
+
+    Returns:
+        (history text, number of turns dropped)
+    """
+    turns = _TURN_SPLIT.split(conversation_history.strip())
+    kept: List[str] = []
+    used = 0
+    for turn in reversed(turns):
+        tokens = count_tokens(turn)
+        if used + tokens > budget:
+            break
+        kept.append(turn)
+        used += tokens
+    if not kept and turns:
+        kept.append(truncate_to_tokens(turns[-1], budget))
+    dropped = len(turns) - len(kept)
+    kept.reverse()
+    if dropped:
+        kept.insert(0, HISTORY_OMITTED_NOTE)
+    return "\n\n".join(kept), dropped
+
+
+def _fit_context(chunks: List[str], budget: int) -> Tuple[List[str], int]:
+    """
+    Keep chunks in retrieval order until `budget` tokens are used; the chunk that crosses
+    the budget is truncated to the remaining room.
+
+    Returns:
+        (chunks kept, number of chunks dropped or truncated)
+    """
+    kept: List[str] = []
+    used = 0
+    for chunk in chunks:
+        tokens = count_tokens(chunk)
+        if used + tokens > budget:
+            if budget > used:
+                kept.append(truncate_to_tokens(chunk, budget - used))
+            # The truncated chunk (if any) still counts as trimmed
+            return kept, len(chunks) - len(kept) + (1 if budget > used else 0)
+        kept.append(chunk)
+        used += tokens
+    return kept, 0
+
+
+def build_prompt(prompt: str, chunks: List[str], conversation_history: str = None) -> Tuple[List[dict], Dict[str, int]]:
+    """
+    Build the chat messages (instructions, document context, user prompt) within token budgets.
+
+    Instructions, conversation history and document context each get their own budget
+    (PROMPT_INSTRUCTION_TOKENS, PROMPT_HISTORY_TOKENS, PROMPT_CONTEXT_TOKENS), so prompt
+    size stays bounded however long a thread grows.
+
+    Returns:
+        (messages, token counts per part plus "total", "history_turns_dropped" and "chunks_trimmed")
+    """
+    instructions = truncate_to_tokens(SYSTEM_INSTRUCTIONS, PROMPT_INSTRUCTION_TOKENS)
+    system_content = instructions
+
+    # If conversation history is provided, include it in the system message
+    history, turns_dropped = "", 0
+    if conversation_history:
+        history, turns_dropped = _fit_history(conversation_history, PROMPT_HISTORY_TOKENS)
+        system_content += f"\n\nPrevious conversation:\n{history}\n\n{HISTORY_INSTRUCTIONS}"
+
+    # Combine chunks into context
+    kept_chunks, chunks_trimmed = _fit_context(chunks, PROMPT_CONTEXT_TOKENS)
+    context = "\n".join(kept_chunks)
+
+    messages = [
+        {"role": "system", "content": system_content},
+        {"role": "system", "content": f"Context from documents:\n{context}"},
+        {"role": "user", "content": prompt}
+    ]
+
+    counts = {
+        "instructions": count_tokens(instructions) + (count_tokens(HISTORY_INSTRUCTIONS) if history else 0),
+        "history": count_tokens(history),
+        "context": count_tokens(context),
+        "question": count_tokens(prompt)
+    }
+    counts["total"] = sum(counts.values())
+    counts["history_turns_dropped"] = turns_dropped
+    counts["chunks_trimmed"] = chunks_trimmed
+    print(f"[modelCall] prompt tokens: instructions={counts['instructions']} history={counts['history']} "
+          f"context={counts['context']} question={counts['question']} total={counts['total']} "
+          f"(dropped {turns_dropped} history turns, trimmed {chunks_trimmed} chunks)")
+    return messages, counts
+
+
+def _ignore(name: str, value: float) -> None:
+    pass
+
+
+# Metrics sinks, (stage, seconds) and (kind, token count); the backend installs its own via set_metrics_hooks
+_observe_stage: Callable[[str, float], None] = _ignore
+_observe_tokens: Callable[[str, float], None] = _ignore
+
+
+def set_metrics_hooks(observe_stage: Callable[[str, float], None], observe_tokens: Callable[[str, float], None]) -> None:
+    """Report model call latencies and token counts to the given callbacks."""
+    global _observe_stage, _observe_tokens
+    _observe_stage = observe_stage
+    _observe_tokens = observe_tokens
+
+
+def _record_tokens(usage, messages: List[dict], text: str, prompt_tokens: int = None) -> None:
+    """Record prompt/completion token counts, preferring the API's usage report over local counts."""
+    if prompt_tokens is None:
+        prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+    _observe_tokens("prompt", getattr(usage, "prompt_tokens", None) or prompt_tokens)
+    _observe_tokens("completion", getattr(usage, "completion_tokens", None) or count_tokens(text or ""))
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter (0.5s up to 2^(attempt+1)s) so concurrent retries don't stampede the API."""
+    return random.uniform(0.5, 2 ** (attempt + 1))
+
+
 def get_model_response(prompt: str, chunks: List[str], conversation_history: str = None, max_retries: int = 3) -> str:
     """
     Get a response from the AI model with optional conversation history.
@@ -40,54 +221,28 @@ def get_model_response(prompt: str, chunks: List[str], conversation_history: str
         RateLimitError: If rate limit persists after all retries
         Exception: For other API errors
     """
-    # Combine chunks into context
-    context = "\n".join(chunks)
-
-    # Create the system message with instructions
-    system_content = "You are a helpful AI tutor. Use the following context from the uploaded documents to answer the user's question. If the context doesn't contain relevant information, say so."
-
-    # If conversation history is provided, include it in the system message
-    if conversation_history:
-        system_content += f"\n\nPrevious conversation:\n{conversation_history}\n\nUse this conversation history to provide contextually relevant responses."
-
-    system_message = {
-        "role": "system",
-        "content": system_content
-    }
-
-    # Create the context message
-    context_message = {
-        "role": "system",
-        "content": f"Context from documents:\n{context}"
-    }
-
-    # Create the user message with their prompt
-    user_message = {
-        "role": "user",
-        "content": prompt
-    }
+    messages, counts = build_prompt(prompt, chunks, conversation_history)
 
     # Retry logic with exponential backoff for rate limits
     for attempt in range(max_retries):
         try:
-            # Get completion from the model
+            # Get completion from the model (only successful attempts are timed)
+            request_started = time.perf_counter()
             completion = client.chat.completions.create(
-                model="moonshotai/Kimi-K2-Thinking:novita",
-                messages=[
-                    system_message,
-                    context_message,
-                    user_message
-                ],
+                model=MODEL_NAME,
+                messages=messages,
             )
+            _observe_stage("model.completion", time.perf_counter() - request_started)
 
             # Return the model's response
-            return completion.choices[0].message.content
+            content = completion.choices[0].message.content
+            _record_tokens(completion.usage, messages, content, counts["total"])
+            return content
 
         except RateLimitError as e:
             if attempt < max_retries - 1:
-                # Exponential backoff: wait 2^attempt seconds
-                wait_time = 2 ** attempt
-                print(f"[modelCall] Rate limit hit. Retrying in {wait_time} seconds... (attempt {attempt + 1}/{max_retries})")
+                wait_time = _backoff_delay(attempt)
+                print(f"[modelCall] Rate limit hit. Retrying in {wait_time:.1f} seconds... (attempt {attempt + 1}/{max_retries})")
                 time.sleep(wait_time)
             else:
                 # Final attempt failed
@@ -100,8 +255,8 @@ def get_model_response(prompt: str, chunks: List[str], conversation_history: str
         except (APITimeoutError, InternalServerError) as e:
             # Handle timeouts and 5xx errors with retry
             if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                print(f"[modelCall] {type(e).__name__} occurred. Retrying in {wait_time} seconds... (attempt {attempt + 1}/{max_retries})")
+                wait_time = _backoff_delay(attempt)
+                print(f"[modelCall] {type(e).__name__} occurred. Retrying in {wait_time:.1f} seconds... (attempt {attempt + 1}/{max_retries})")
                 time.sleep(wait_time)
             else:
                 print(f"[modelCall] {type(e).__name__} persisted after {max_retries} attempts")
@@ -110,3 +265,126 @@ def get_model_response(prompt: str, chunks: List[str], conversation_history: str
             # Non-rate-limit errors, raise immediately
             print(f"[modelCall] API error: {type(e).__name__}: {e}")
             raise
+
+
+async def _complete_async(messages: List[dict], max_retries: int = 3, prompt_tokens: int = None) -> str:
+    """
+    Run one chat completion on the pooled AsyncOpenAI client, retrying rate limits,
+    timeouts and 5xx errors with backoff (asyncio.sleep, so no worker thread is held).
+    """
+    for attempt in range(max_retries):
+        try:
+            request_started = time.perf_counter()
+            completion = await async_client.chat.completions.create(
+                model=MODEL_NAME,
+                messages=messages,
+            )
+            _observe_stage("model.completion", time.perf_counter() - request_started)
+            content = completion.choices[0].message.content
+            _record_tokens(completion.usage, messages, content, prompt_tokens)
+            return content
+
+        except RateLimitError as e:
+            if attempt < max_retries - 1:
+                wait_time = _backoff_delay(attempt)
+                print(f"[modelCall] Rate limit hit. Retrying in {wait_time:.1f} seconds... (attempt {attempt + 1}/{max_retries})")
+                await asyncio.sleep(wait_time)
+            else:
+                print(f"[modelCall] Rate limit persisted after {max_retries} attempts")
+                raise RateLimitError(
+                    "The AI service is currently experiencing high demand. Please wait a moment and try again.",
+                    response=e.response,
+                    body=e.body
+                )
+        except (APITimeoutError, InternalServerError) as e:
+            if attempt < max_retries - 1:
+                wait_time = _backoff_delay(attempt)
+                print(f"[modelCall] {type(e).__name__} occurred. Retrying in {wait_time:.1f} seconds... (attempt {attempt + 1}/{max_retries})")
+                await asyncio.sleep(wait_time)
+            else:
+                print(f"[modelCall] {type(e).__name__} persisted after {max_retries} attempts")
+                raise Exception(f"The AI service is temporarily unavailable (timeout/server error). Please try again in a few minutes.")
+        except Exception as e:
+            print(f"[modelCall] API error: {type(e).__name__}: {e}")
+            raise
+
+
+async def get_model_response_async(prompt: str, chunks: List[str], conversation_history: str = None, max_retries: int = 3) -> str:
+    """
+    Async variant of get_model_response using the pooled AsyncOpenAI client.
+
+    Arguments, return value and raised errors match get_model_response.
+    """
+    messages, counts = build_prompt(prompt, chunks, conversation_history)
+    return await _complete_async(messages, max_retries, counts["total"])
+
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a tutoring conversation between a student and an AI tutor. "
+    "Merge the existing summary with the new messages into one concise summary of at most 150 words: "
+    "topics covered, the student's questions, key explanations given and anything the student struggled with. "
+    "Reply with the summary only."
+)
+
+
+async def summarize_conversation_async(previous_summary: str, transcript: str, max_retries: int = 3) -> str:
+    """
+    Fold older conversation turns into a thread's rolling summary.
+
+    Args:
+        previous_summary: The thread's current summary ("" if none yet)
+        transcript: Formatted messages ("User: ...\n\nAssistant: ...") to merge into it
+
+    Returns:
+        The updated summary text
+    """
+    messages = [
+        {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+        {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"}
+    ]
+    return await _complete_async(messages, max_retries)
+
+
+async def stream_model_response_async(prompt: str, chunks: List[str], conversation_history: str = None, max_retries: int = 3) -> AsyncIterator[str]:
+    """
+    Stream the model's answer token by token using chat.completions.create(stream=True).
+
+    Yields content deltas as they arrive. Rate limits, timeouts and 5xx errors are retried
+    with backoff only until the first token is sent; after that, errors propagate.
+    """
+    messages, counts = build_prompt(prompt, chunks, conversation_history)
+
+    for attempt in range(max_retries):
+        started = False
+        request_started = time.perf_counter()
+        parts: List[str] = []
+        try:
+            stream = await async_client.chat.completions.create(
+                model=MODEL_NAME,
+                messages=messages,
+                stream=True,
+            )
+            async for event in stream:
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if delta:
+                    if not started:
+                        _observe_stage("model.first_token", time.perf_counter() - request_started)
+                    started = True
+                    parts.append(delta)
+                    yield delta
+            _observe_stage("model.stream", time.perf_counter() - request_started)
+            _record_tokens(None, messages, "".join(parts), counts["total"])
+            return
+
+        except (RateLimitError, APITimeoutError, InternalServerError) as e:
+            if started or attempt >= max_retries - 1:
+                print(f"[modelCall] {type(e).__name__} during stream after {attempt + 1} attempts")
+                raise
+            wait_time = _backoff_delay(attempt)
+            print(f"[modelCall] {type(e).__name__} before first token. Retrying in {wait_time:.1f} seconds... (attempt {attempt + 1}/{max_retries})")
+            await asyncio.sleep(wait_time)
+        except Exception as e:
+            print(f"[modelCall] API error: {type(e).__name__}: {e}")
+            raise
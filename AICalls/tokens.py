@@ -0,0 +1,43 @@
+"""
+Token counting for TutorApp
+Uses tiktoken when it is installed, otherwise a fast word/punctuation estimate.
+Lives next to modelCall (which budgets prompts with it) and is re-exported by BackEnd.tokens.
+"""
+
+import os
+import re
+
+# tiktoken is optional (pip install tiktoken); without it token counts are estimated
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding(os.getenv("TOKEN_ENCODING", "cl100k_base"))
+except Exception:
+    _encoding = None
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """Return the number of tokens in `text` (exact with tiktoken, estimated otherwise)."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    # One token per word or punctuation mark, plus one per 8 characters of long words
+    return sum(1 + len(tok) // 8 for tok in _TOKEN_PATTERN.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Return the longest prefix of `text` that fits in `max_tokens` tokens."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens])
+    used = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        used += 1 + len(match.group()) // 8
+        if used > max_tokens:
+            return text[:match.start()].rstrip()
+    return text
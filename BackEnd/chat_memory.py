@@ -3,10 +3,25 @@ Chat Memory Manager for TutorApp
 Manages chat threads and message history using ChromaDB cloud storage.
 """
 
+import os
 import uuid
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from .chromaConnection import get_chroma_client
+from .thread_cache import ThreadHistoryCache
+from .tokens import truncate_to_tokens
+from .metrics import timed
+
+# Most recent messages of a thread that are always kept verbatim (never summarized)
+THREAD_SUMMARY_KEEP_RECENT = int(os.getenv("THREAD_SUMMARY_KEEP_RECENT", "8"))
+# Older messages are folded into the rolling summary once this many have accumulated
+THREAD_SUMMARY_BATCH = int(os.getenv("THREAD_SUMMARY_BATCH", "8"))
+# Upper bound on the stored summary length
+THREAD_SUMMARY_MAX_TOKENS = int(os.getenv("THREAD_SUMMARY_MAX_TOKENS", "400"))
+# Appends are serialized per thread through a fixed pool of locks (threads hash onto one)
+THREAD_LOCK_STRIPES = int(os.getenv("THREAD_LOCK_STRIPES", "256"))
 
 
 class ChatMemoryManager:
@@ -21,6 +36,18 @@ class ChatMemoryManager:
         """Initialize the ChatMemoryManager with ChromaDB connection."""
         self.client = get_chroma_client()
         self.collection = self._get_or_create_collection()
+        # Cached thread_start marker metadata (holds the per-thread message counter); LRU, rebuilt
+        # from storage on a miss
+        self._markers: "OrderedDict[str, Dict]" = OrderedDict()
+        # Striped per-thread locks so concurrent appends never reserve the same message_index;
+        # a fixed pool keeps memory bounded however many threads are touched
+        self._thread_locks: List[threading.Lock] = [threading.Lock() for _ in range(max(1, THREAD_LOCK_STRIPES))]
+        # Write-through cache of recent messages for hot threads
+        self.cache = ThreadHistoryCache()
+        # Cached rolling summaries (LRU, as many threads as the history cache): thread_id -> {"text", "through"}
+        self._summaries: "OrderedDict[str, Dict]" = OrderedDict()
+        # Guards both per-thread LRUs (_markers, _summaries)
+        self._state_guard = threading.Lock()
 
     def _get_or_create_collection(self):
         """
@@ -36,6 +63,120 @@ class ChatMemoryManager:
         except Exception as e:
             raise RuntimeError(f"Failed to initialize chat_history collection: {str(e)}")
 
+    @staticmethod
+    def _start_id(thread_id: str) -> str:
+        """ID of the thread_start marker record for a thread."""
+        return f"{thread_id}-start"
+
+    @staticmethod
+    def _summary_id(thread_id: str) -> str:
+        """ID of the rolling summary record for a thread."""
+        return f"{thread_id}-summary"
+
+    def _thread_lock(self, thread_id: str) -> threading.Lock:
+        """Return the lock guarding appends to a thread (shared with the threads hashing to the same stripe)."""
+        return self._thread_locks[hash(thread_id) % len(self._thread_locks)]
+
+    def _cached(self, store: "OrderedDict[str, Dict]", thread_id: str) -> Optional[Dict]:
+        """Return a thread's entry in one of the per-thread LRUs, marking it recently used."""
+        with self._state_guard:
+            value = store.get(thread_id)
+            if value is not None:
+                store.move_to_end(thread_id)
+            return value
+
+    def _cache(self, store: "OrderedDict[str, Dict]", thread_id: str, value: Optional[Dict]) -> None:
+        """Store (or with None, drop) a thread's entry in a per-thread LRU, evicting the least recently used.
+
+        Both LRUs hold as many threads as the history cache, so per-thread state stays bounded.
+        """
+        with self._state_guard:
+            if value is None:
+                store.pop(thread_id, None)
+                return
+            store[thread_id] = value
+            store.move_to_end(thread_id)
+            while len(store) > self.cache.max_threads:
+                store.popitem(last=False)
+
+    @staticmethod
+    def _preview(text: str) -> str:
+        """Short preview of a message used in thread listings."""
+        return text[:50] + "..." if len(text) > 50 else text
+
+    def _backfill_marker(self, thread_id: str, marker: Optional[Dict]) -> Dict:
+        """
+        Fill in the thread summary fields (next_message_index, message_count, preview)
+        for threads created before they were tracked on the marker.
+
+        This scans the thread once; afterwards the fields are maintained incrementally.
+        """
+        existing = self.collection.get(where={"thread_id": thread_id}, include=["metadatas", "documents"])
+        next_index = len(existing['ids'])
+        messages = []
+        for i, record_id in enumerate(existing['ids']):
+            _, sep, suffix = record_id.rpartition("-msg-")
+            if sep and suffix.isdigit():
+                next_index = max(next_index, int(suffix) + 1)
+            metadata = existing['metadatas'][i]
+            if metadata.get('message_type') == 'message':
+                messages.append((metadata.get('message_index', 0), metadata['role'], existing['documents'][i]))
+
+        messages.sort(key=lambda m: m[0])
+        preview = next((self._preview(doc) for _, role, doc in messages if role == 'user'), "New chat")
+
+        if marker is None:
+            # No marker (thread never created through create_thread): keep the summary locally only
+            marker = {"_local_only": True}
+        marker.update({
+            "next_message_index": next_index,
+            "message_count": len(messages),
+            "preview": preview
+        })
+        if not marker.get('_local_only'):
+            self.collection.update(ids=[self._start_id(thread_id)], metadatas=[marker])
+        return marker
+
+    def _load_marker(self, thread_id: str) -> Dict:
+        """
+        Return the thread_start marker metadata, fetching it by ID on a cache miss.
+
+        The marker doubles as the thread's summary record: it carries the message counter,
+        message_count and preview, all maintained incrementally by add_message.
+        """
+        marker = self._cached(self._markers, thread_id)
+        if marker is not None:
+            return marker
+
+        result = self.collection.get(ids=[self._start_id(thread_id)], include=["metadatas"])
+        marker = dict(result['metadatas'][0]) if result['ids'] else None
+
+        if marker is None or 'message_count' not in marker:
+            marker = self._backfill_marker(thread_id, marker)
+
+        self._cache(self._markers, thread_id, marker)
+        return marker
+
+    def _record_append(self, thread_id: str, role: str, content: str) -> int:
+        """
+        Reserve the next message_index for a thread and update its summary.
+        Caller must hold the thread lock.
+
+        The counter and summary live in the thread_start marker, so this is a single
+        constant-cost metadata update instead of re-reading the whole thread.
+        """
+        marker = self._load_marker(thread_id)
+        message_index = marker['next_message_index']
+        marker['next_message_index'] = message_index + 1
+        marker['message_count'] = marker.get('message_count', 0) + 1
+        if role == 'user' and marker.get('preview', "New chat") == "New chat":
+            marker['preview'] = self._preview(content)
+
+        if not marker.get('_local_only'):
+            self.collection.update(ids=[self._start_id(thread_id)], metadatas=[marker])
+        return message_index
+
+    @timed("chat_memory.create_thread")
     def create_thread(self, session_id: Optional[str] = None) -> str:
         """
         Create a new chat thread.
@@ -49,21 +190,29 @@ class ChatMemoryManager:
         thread_id = f"thread_{uuid.uuid4().hex[:12]}"
         timestamp = datetime.utcnow().isoformat()
 
-        # Add initial metadata document to mark thread creation
+        # Add initial metadata document to mark thread creation.
+        # The marker also carries the thread's summary: message counter (the marker itself
+        # is index 0), message_count and preview.
+        marker = {
+            "thread_id": thread_id,
+            "role": "system",
+            "timestamp": timestamp,
+            "session_id": session_id or "default",
+            "message_type": "thread_start",
+            "next_message_index": 1,
+            "message_count": 0,
+            "preview": "New chat"
+        }
         self.collection.add(
             documents=[f"Thread created"],
-            metadatas=[{
-                "thread_id": thread_id,
-                "role": "system",
-                "timestamp": timestamp,
-                "session_id": session_id or "default",
-                "message_type": "thread_start"
-            }],
-            ids=[f"{thread_id}-start"]
+            metadatas=[marker],
+            ids=[self._start_id(thread_id)]
         )
+        self._cache(self._markers, thread_id, dict(marker))
 
         return thread_id
 
+    @timed("chat_memory.add_message")
     def add_message(self, thread_id: str, role: str, content: str, session_id: Optional[str] = None) -> str:
         """
         Add a message to a chat thread.
@@ -82,56 +231,51 @@ class ChatMemoryManager:
 
         timestamp = datetime.utcnow().isoformat()
 
-        # Get current message count for this thread to generate sequential IDs
-        existing = self.collection.get(
-            where={"thread_id": thread_id}
-        )
-        message_index = len(existing['ids'])
-
-        message_id = f"{thread_id}-msg-{message_index}"
+        with self._thread_lock(thread_id):
+            # Sequential IDs come from the per-thread counter, not a count of existing messages
+            message_index = self._record_append(thread_id, role, content)
+            message_id = f"{thread_id}-msg-{message_index}"
+
+            self.collection.add(
+                documents=[content],
+                metadatas=[{
+                    "thread_id": thread_id,
+                    "role": role,
+                    "timestamp": timestamp,
+                    "session_id": session_id or "default",
+                    "message_type": "message",
+                    "message_index": message_index
+                }],
+                ids=[message_id]
+            )
 
-        self.collection.add(
-            documents=[content],
-            metadatas=[{
-                "thread_id": thread_id,
-                "role": role,
-                "timestamp": timestamp,
-                "session_id": session_id or "default",
-                "message_type": "message",
-                "message_index": message_index
-            }],
-            ids=[message_id]
-        )
+            self.cache.append(thread_id, {
+                'id': message_id,
+                'role': role,
+                'content': content,
+                'timestamp': timestamp,
+                'message_index': message_index
+            })
 
         return message_id
 
-    def get_thread_history(self, thread_id: str, limit: Optional[int] = None) -> List[Dict]:
+    def _fetch_messages(self, thread_id: str, start: Optional[int] = None, end: Optional[int] = None) -> List[Dict]:
         """
-        Retrieve all messages in a chat thread, ordered by timestamp.
+        Fetch messages of a thread, optionally restricted to start <= message_index < end.
 
-        Args:
-            thread_id: The thread to retrieve
-            limit: Optional limit on number of messages to return (most recent)
-
-        Returns:
-            List of message dictionaries with keys: id, role, content, timestamp
+        Returns message dictionaries sorted by message_index.
         """
-        results = self.collection.get(
-            where={"thread_id": thread_id}
-        )
+        conditions = [{"thread_id": thread_id}, {"message_type": "message"}]
+        if start is not None:
+            conditions.append({"message_index": {"$gte": start}})
+        if end is not None:
+            conditions.append({"message_index": {"$lt": end}})
 
-        if not results['ids']:
-            return []
+        results = self.collection.get(where={"$and": conditions})
 
-        # Combine results into message dictionaries
         messages = []
         for i in range(len(results['ids'])):
             metadata = results['metadatas'][i]
-
-            # Skip system messages (thread_start)
-            if metadata.get('message_type') == 'thread_start':
-                continue
-
             messages.append({
                 'id': results['ids'][i],
                 'role': metadata['role'],
@@ -142,22 +286,84 @@ class ChatMemoryManager:
 
         # Sort by message_index to ensure correct order
         messages.sort(key=lambda x: x['message_index'])
+        return messages
+
+    @timed("chat_memory.get_thread_history")
+    def get_thread_history(self, thread_id: str, limit: Optional[int] = None, before: Optional[int] = None) -> List[Dict]:
+        """
+        Retrieve messages in a chat thread, ordered by message_index.
 
-        # Apply limit if specified (return most recent)
-        if limit and limit < len(messages):
-            messages = messages[-limit:]
+        With a limit, only the last `limit` messages (before the `before` cursor, if given)
+        are fetched, using the thread's message counter to read just that index window.
+        The cost is therefore independent of thread length.
+
+        Args:
+            thread_id: The thread to retrieve
+            limit: Optional limit on number of messages to return (most recent)
+            before: Optional cursor; only messages with message_index < before are returned
+
+        Returns:
+            List of message dictionaries with keys: id, role, content, timestamp, message_index
+        """
+        cached = self.cache.get(thread_id)
+        if cached is not None:
+            messages, complete = cached
+            if before is not None:
+                messages = [m for m in messages if m['message_index'] < before]
+            if limit and (len(messages) >= limit or complete):
+                return messages[-limit:]
+            if not limit and complete:
+                return messages
+
+        # Older pages are read straight through; only the newest tail is cached
+        if before is not None:
+            if not limit:
+                return self._fetch_messages(thread_id, end=before)
+            return self._read_tail(thread_id, limit, before)
+
+        # Hold the thread lock so a concurrent append can't be lost when the cache is filled
+        with self._thread_lock(thread_id):
+            if not limit:
+                messages = self._fetch_messages(thread_id)
+                self.cache.put(thread_id, messages, complete=True)
+                return messages
+
+            # Load at least a full cache window so follow-up turns are served from memory
+            window = max(limit, self.cache.max_messages)
+            messages = self._read_tail(thread_id, window)
+            self.cache.put(thread_id, messages, complete=len(messages) < window)
+            return messages[-limit:]
+
+    def _read_tail(self, thread_id: str, limit: int, before: Optional[int] = None) -> List[Dict]:
+        """Fetch the last `limit` messages with message_index < before (or the newest ones)."""
+        upper = self._load_marker(thread_id)['next_message_index']
+        if before is not None:
+            upper = min(upper, before)
+
+        # Indices are normally contiguous; widen the window only if some are missing
+        messages: List[Dict] = []
+        while len(messages) < limit and upper > 0:
+            lower = max(0, upper - (limit - len(messages)))
+            messages = self._fetch_messages(thread_id, start=lower, end=upper) + messages
+            upper = lower
 
         return messages
 
-    def list_threads(self, session_id: Optional[str] = None) -> List[Dict]:
+    @timed("chat_memory.list_threads")
+    def list_threads(self, session_id: Optional[str] = None, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
         """
-        List all chat threads, optionally filtered by session.
+        List chat threads (most recent first), optionally filtered by session.
+
+        Message counts and previews are read from the thread_start markers, so this is
+        a single bulk read regardless of how many threads exist.
 
         Args:
             session_id: Optional session filter
+            limit: Optional page size
+            offset: Number of threads to skip (for pagination)
 
         Returns:
-            List of thread info dictionaries with keys: thread_id, created_at, message_count
+            List of thread info dictionaries with keys: thread_id, created_at, message_count, preview
         """
         # Get all thread start markers
         if session_id:
@@ -170,46 +376,38 @@ class ChatMemoryManager:
         else:
             where_clause = {"message_type": "thread_start"}
 
-        results = self.collection.get(where=where_clause)
+        results = self.collection.get(where=where_clause, include=["metadatas"])
 
         if not results['ids']:
             return []
 
         threads = []
-        for i in range(len(results['ids'])):
-            metadata = results['metadatas'][i]
+        for metadata in results['metadatas']:
             thread_id = metadata['thread_id']
-
-            # Get message count for this thread (using $and for multiple conditions)
-            thread_messages = self.collection.get(
-                where={
-                    "$and": [
-                        {"thread_id": thread_id},
-                        {"message_type": "message"}
-                    ]
-                }
-            )
-
-            # Get first user message as preview
-            preview = "New chat"
-            if thread_messages['ids']:
-                for j, msg_meta in enumerate(thread_messages['metadatas']):
-                    if msg_meta['role'] == 'user':
-                        preview = thread_messages['documents'][j][:50] + "..." if len(thread_messages['documents'][j]) > 50 else thread_messages['documents'][j]
-                        break
+            if 'message_count' not in metadata:
+                # Thread predates the summary fields; backfill once
+                metadata = self._load_marker(thread_id)
 
             threads.append({
                 'thread_id': thread_id,
                 'created_at': metadata['timestamp'],
-                'message_count': len(thread_messages['ids']),
-                'preview': preview
+                'message_count': metadata.get('message_count', 0),
+                'preview': metadata.get('preview', "New chat")
             })
 
         # Sort by creation time (most recent first)
         threads.sort(key=lambda x: x['created_at'], reverse=True)
 
-        return threads
+        if limit is not None:
+            return threads[offset:offset + limit]
+        return threads[offset:]
 
+    @timed("chat_memory.get_message_count")
+    def get_message_count(self, thread_id: str) -> int:
+        """Return the number of messages in a thread (read from its summary marker)."""
+        return self._load_marker(thread_id).get('message_count', 0)
+
+    @timed("chat_memory.delete_thread")
     def delete_thread(self, thread_id: str) -> bool:
         """
         Delete a chat thread and all its messages.
@@ -223,7 +421,8 @@ class ChatMemoryManager:
         try:
             # Get all message IDs for this thread
             results = self.collection.get(
-                where={"thread_id": thread_id}
+                where={"thread_id": thread_id},
+                include=[]
             )
 
             if not results['ids']:
@@ -231,30 +430,130 @@ class ChatMemoryManager:
 
             # Delete all messages
             self.collection.delete(ids=results['ids'])
+            self._cache(self._markers, thread_id, None)
+            self._cache(self._summaries, thread_id, None)
+            self.cache.invalidate(thread_id)
 
             return True
         except Exception as e:
             raise RuntimeError(f"Failed to delete thread {thread_id}: {str(e)}")
 
-    def get_recent_context(self, thread_id: str, max_messages: int = 10) -> str:
+    @timed("chat_memory.get_summary")
+    def get_summary(self, thread_id: str) -> Dict:
         """
-        Get recent conversation context as a formatted string for AI prompting.
+        Return the thread's rolling summary as {"text", "through"}.
 
-        Args:
-            thread_id: The thread to get context from
-            max_messages: Maximum number of recent messages to include
+        The summary covers every message with message_index < through; text is "" (and
+        through is 1, the first message index) until the thread is first summarized.
+        """
+        summary = self._cached(self._summaries, thread_id)
+        if summary is not None:
+            return summary
+
+        result = self.collection.get(ids=[self._summary_id(thread_id)], include=["documents", "metadatas"])
+        if result['ids']:
+            summary = {
+                "text": result['documents'][0],
+                "through": result['metadatas'][0].get('summarized_through', 1)
+            }
+        else:
+            summary = {"text": "", "through": 1}
+        self._cache(self._summaries, thread_id, summary)
+        return summary
+
+    @timed("chat_memory.pending_summary")
+    def pending_summary(self, thread_id: str) -> Optional[Tuple[str, str, int]]:
+        """
+        Check whether a thread has enough older messages to fold into its summary.
+
+        Messages older than the last THREAD_SUMMARY_KEEP_RECENT are summarized in batches
+        of at least THREAD_SUMMARY_BATCH, so the model is called once per batch rather
+        than once per turn.
 
         Returns:
-            Formatted conversation history string
+            (current summary text, formatted messages to fold in, new `through` index),
+            or None if nothing needs summarizing yet
         """
-        messages = self.get_thread_history(thread_id, limit=max_messages)
+        next_index = self._load_marker(thread_id)['next_message_index']
+        summary = self.get_summary(thread_id)
+        through = next_index - THREAD_SUMMARY_KEEP_RECENT
+        if through - summary['through'] < THREAD_SUMMARY_BATCH:
+            return None
 
+        messages = self._fetch_messages(thread_id, start=summary['through'], end=through)
         if not messages:
-            return ""
+            return None
+        return summary['text'], self._format_messages(messages), through
+
+    @timed("chat_memory.save_summary")
+    def save_summary(self, thread_id: str, text: str, through: int) -> bool:
+        """
+        Store a new rolling summary covering messages with message_index < through.
+
+        Returns:
+            False if the summary was stale (a newer one is stored) or the thread was deleted
+        """
+        with self._thread_lock(thread_id):
+            # An evicted marker is reloaded; a deleted thread comes back with no messages
+            marker = self._load_marker(thread_id)
+            if not marker.get('message_count') or through <= self.get_summary(thread_id)['through']:
+                return False
 
+            text = truncate_to_tokens(text, THREAD_SUMMARY_MAX_TOKENS)
+            if not marker.get('_local_only'):
+                self.collection.upsert(
+                    documents=[text],
+                    metadatas=[{
+                        "thread_id": thread_id,
+                        "role": "system",
+                        "timestamp": datetime.utcnow().isoformat(),
+                        "session_id": marker.get('session_id', "default"),
+                        "message_type": "thread_summary",
+                        "summarized_through": through
+                    }],
+                    ids=[self._summary_id(thread_id)]
+                )
+            self._cache(self._summaries, thread_id, {"text": text, "through": through})
+        return True
+
+    @staticmethod
+    def _format_messages(messages: List[Dict]) -> str:
         context_parts = []
         for msg in messages:
             role_label = "User" if msg['role'] == 'user' else "Assistant"
             context_parts.append(f"{role_label}: {msg['content']}")
 
         return "\n\n".join(context_parts)
+
+    @timed("chat_memory.get_recent_context")
+    def get_recent_context(self, thread_id: str, max_messages: int = 10) -> str:
+        """
+        Get recent conversation context as a formatted string for AI prompting.
+
+        The context is the rolling summary (once one exists) followed by every message not
+        yet folded into it, so no turn falls between the two, including the turns of a
+        thread that has outgrown max_messages but not yet been summarized. Its size stays
+        roughly constant however long the thread grows.
+
+        Args:
+            thread_id: The thread to get context from
+            max_messages: Minimum number of recent messages to include
+
+        Returns:
+            Formatted conversation history string
+        """
+        summary = self.get_summary(thread_id)
+
+        # Normally at most KEEP_RECENT + BATCH messages; capped in case summarizing falls behind
+        unsummarized = self._load_marker(thread_id)['next_message_index'] - summary['through']
+        cap = max(max_messages, THREAD_SUMMARY_KEEP_RECENT) + THREAD_SUMMARY_BATCH
+        limit = min(max(max_messages, unsummarized), cap)
+        messages = [m for m in self.get_thread_history(thread_id, limit=limit)
+                    if m['message_index'] >= summary['through']]
+
+        parts = []
+        if summary['text']:
+            parts.append(f"Summary of earlier conversation:\n{summary['text']}")
+        if messages:
+            parts.append(self._format_messages(messages))
+        return "\n\n".join(parts)
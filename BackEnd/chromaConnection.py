@@ -7,19 +7,30 @@ load_dotenv()
 
 _client = None
 
-def get_chroma_client():
-    """Lazily create and return a Chroma CloudClient using environment variables.
+# Record quota applied to uploads on Chroma Cloud when CHROMA_MAX_RECORDS is not set
+DEFAULT_CLOUD_MAX_RECORDS = 300
+
+
+def get_backend_name() -> str:
+    """Return the configured vector store backend: "cloud" (default), "persistent" or "memory"."""
+    return os.getenv("CHROMA_BACKEND", "cloud").strip().lower()
 
-    Required environment variables:
-      - CHROMA_API_KEY
-    Optional:
-      - CHROMA_TENANT
-      - CHROMA_DATABASE (defaults to 'TutorDatabase')
+
+def get_record_quota():
+    """Return the maximum number of records allowed in the study collection, or None for no limit.
+
+    CHROMA_MAX_RECORDS always wins when set. Otherwise the cloud backend keeps the
+    conservative default tenant quota and local backends are unlimited.
     """
-    global _client
-    if _client is not None:
-        return _client
+    configured = os.getenv("CHROMA_MAX_RECORDS")
+    if configured:
+        return int(configured)
+    if get_backend_name() == "cloud":
+        return DEFAULT_CLOUD_MAX_RECORDS
+    return None
+
 
+def _create_cloud_client():
     api_key = os.getenv("CHROMA_API_KEY")
     # Backwards-compat/fallback: some users may have put the key under AZURE_OPENAI_KEY
     # (or pasted the Chroma key into a different env var). Try that as a fallback.
@@ -36,16 +47,57 @@ def get_chroma_client():
         api_key = api_key[1:-1]
 
     try:
-        _client = chromadb.CloudClient(
+        return chromadb.CloudClient(
             api_key=api_key,
             tenant=tenant,
             database=database
         )
-        return _client
     except Exception as e:
         # Wrap and raise a clearer error for debugging at startup
         raise RuntimeError(f"Failed to create Chroma CloudClient: {e}")
 
+
+def get_chroma_client():
+    """Lazily create and return the Chroma client selected by CHROMA_BACKEND.
+
+    All backends expose the same collection interface, so callers don't need to care
+    which one is in use.
+
+    CHROMA_BACKEND:
+      - cloud (default): chromadb.CloudClient
+          Required: CHROMA_API_KEY
+          Optional: CHROMA_TENANT, CHROMA_DATABASE (defaults to 'TutorDatabase')
+      - persistent: embedded chromadb.PersistentClient storing data under
+          CHROMA_PERSIST_PATH (defaults to BackEnd/chroma_data)
+      - memory: in-process chromadb.EphemeralClient (data is lost on restart;
+          useful for tests and offline benchmarks)
+    """
+    global _client
+    if _client is not None:
+        return _client
+
+    backend = get_backend_name()
+    try:
+        if backend == "cloud":
+            _client = _create_cloud_client()
+        elif backend == "persistent":
+            persist_path = os.getenv(
+                "CHROMA_PERSIST_PATH",
+                os.path.join(os.path.dirname(os.path.abspath(__file__)), "chroma_data")
+            )
+            _client = chromadb.PersistentClient(path=persist_path)
+        elif backend == "memory":
+            _client = chromadb.EphemeralClient()
+        else:
+            raise RuntimeError(f"Unknown CHROMA_BACKEND '{backend}'. Use 'cloud', 'persistent' or 'memory'.")
+    except RuntimeError:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"Failed to create Chroma {backend} client: {e}")
+
+    print(f"[chroma] using {backend} backend")
+    return _client
+
 def _reset_client_for_tests():
     """Internal helper to reset the client (useful for tests)."""
     global _client
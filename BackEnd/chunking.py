@@ -0,0 +1,228 @@
+"""
+Streaming text chunker for TutorApp
+Turns text arriving in pieces (file blocks, PDF pages) into sentence-aligned chunks in bounded memory.
+"""
+
+import os
+import re
+import codecs
+from typing import Iterable, Iterator, List, Optional
+
+from .tokens import count_tokens
+
+_WHITESPACE = re.compile(r"\s+")
+# Sentence boundary: terminal punctuation followed by whitespace (same heuristic as before)
+_SENTENCE_SPLIT = re.compile(r'(?<=[\.!?])\s+')
+_BOUNDARY = re.compile(r'[\.!?]\s+')
+
+# Bytes decoded per block when chunking an uploaded text file
+TEXT_BLOCK_BYTES = 64 * 1024
+
+
+class StreamingChunker:
+    """
+    Incremental sentence chunker.
+
+    Call feed() with each new piece of text and collect the chunks it returns, then
+    finish() once the input ends. Only the trailing, still-incomplete sentence and the
+    chunk being built are held in memory, never the whole document.
+
+    Chunks follow the original upload rules: whitespace is collapsed, text is split on
+    sentence boundaries, sentences are accumulated until the next one would exceed
+    `chunk_size`, and at most `max_chunks` chunks are produced. With `overlap` > 0,
+    each chunk starts with the trailing sentences (up to `overlap` in size) of the
+    previous one. Sizes are measured in characters, or in tokens when `size_unit`
+    is "tokens".
+    """
+
+    def __init__(self, chunk_size: int = 800, max_chunks: int = 200, overlap: int = 0, size_unit: str = "chars"):
+        if size_unit not in ("chars", "tokens"):
+            raise ValueError(f"Invalid size_unit: {size_unit}. Must be 'chars' or 'tokens'")
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.overlap = overlap
+        self._measure = len if size_unit == "chars" else count_tokens
+        # Characters count the joining space; token counts don't
+        self._separator = 1 if size_unit == "chars" else 0
+
+        self._pending = ""
+        self._current: List[str] = []
+        self._current_sizes: List[int] = []
+        self._current_len = 0
+        self._emitted = 0
+        # A "sentence" with no terminal punctuation is force-split once it grows past this
+        self._max_pending = max(chunk_size * 8, 64 * 1024)
+
+    @classmethod
+    def from_env(cls) -> "StreamingChunker":
+        """
+        Build a chunker from CHUNK_SIZE_CHARS, MAX_CHUNKS_PER_FILE and CHUNK_OVERLAP.
+
+        Setting CHUNK_SIZE_TOKENS switches to token-based sizing (CHUNK_OVERLAP is then in tokens too).
+        """
+        max_chunks = int(os.getenv("MAX_CHUNKS_PER_FILE", "200"))
+        overlap = int(os.getenv("CHUNK_OVERLAP", "0"))
+        size_tokens = os.getenv("CHUNK_SIZE_TOKENS")
+        if size_tokens:
+            return cls(int(size_tokens), max_chunks, overlap, size_unit="tokens")
+        return cls(int(os.getenv("CHUNK_SIZE_CHARS", "800")), max_chunks, overlap)
+
+    @property
+    def full(self) -> bool:
+        """True once max_chunks chunks have been produced; further input is ignored."""
+        return self._emitted >= self.max_chunks
+
+    def _flush(self, out: List[str]) -> None:
+        out.append(' '.join(self._current).strip())
+        self._emitted += 1
+
+        # Carry the trailing sentences that fit in the overlap into the next chunk
+        keep = 0
+        kept_len = 0
+        while self.overlap and keep < len(self._current) - 1:
+            size = self._current_sizes[-(keep + 1)]
+            if kept_len + size + self._separator > self.overlap:
+                break
+            kept_len += size + self._separator
+            keep += 1
+        self._current = self._current[len(self._current) - keep:] if keep else []
+        self._current_sizes = self._current_sizes[len(self._current_sizes) - keep:] if keep else []
+        self._current_len = kept_len
+
+    def _add_sentences(self, text: str, out: List[str]) -> None:
+        normalized = _WHITESPACE.sub(" ", text).strip()
+        if not normalized:
+            return
+        for s in _SENTENCE_SPLIT.split(normalized):
+            if self.full:
+                return
+            s = s.strip()
+            if not s:
+                continue
+            size = self._measure(s)
+            self._current_sizes.append(size)
+            # If adding this sentence would exceed the target chunk size, flush current
+            if self._current_len + size + self._separator > self.chunk_size and self._current:
+                self._current_sizes.pop()
+                self._flush(out)
+                if self.full:
+                    return
+                self._current.append(s)
+                self._current_sizes.append(size)
+                self._current_len += size
+            else:
+                self._current.append(s)
+                self._current_len += size + self._separator
+
+    def feed(self, text: str) -> List[str]:
+        """Consume the next piece of text and return any chunks it completed."""
+        out: List[str] = []
+        if self.full or not text:
+            return out
+
+        buffer = self._pending + text
+        # Everything up to the last sentence boundary is complete; the rest may continue in the next piece
+        boundary = None
+        for boundary in _BOUNDARY.finditer(buffer):
+            pass
+
+        if boundary is not None:
+            complete, self._pending = buffer[:boundary.end()], buffer[boundary.end():]
+        elif len(buffer) > self._max_pending:
+            # No sentence end in sight: cut at the last whitespace to keep memory bounded
+            cut = buffer.rfind(" ", 0, len(buffer) - 1) + 1 or len(buffer)
+            complete, self._pending = buffer[:cut], buffer[cut:]
+        else:
+            self._pending = buffer
+            return out
+
+        self._add_sentences(complete, out)
+        return out
+
+    def finish(self) -> List[str]:
+        """Flush the remaining text and return the final chunk(s)."""
+        out: List[str] = []
+        if not self.full:
+            self._add_sentences(self._pending, out)
+            if self._current and not self.full:
+                self._flush(out)
+        self._pending = ""
+        self._current = []
+        self._current_sizes = []
+        self._current_len = 0
+        return out
+
+
+def iter_chunks(pieces: Iterable[str], chunker: Optional[StreamingChunker] = None) -> Iterator[str]:
+    """Yield chunks from an iterable of text pieces (file blocks, pages, ...)."""
+    chunker = chunker or StreamingChunker.from_env()
+    for piece in pieces:
+        yield from chunker.feed(piece)
+        if chunker.full:
+            return
+    yield from chunker.finish()
+
+
+def iter_decoded_blocks(content: bytes, encoding: str = "utf-8", block_size: int = TEXT_BLOCK_BYTES) -> Iterator[str]:
+    """Decode bytes block by block (multi-byte characters split across blocks are handled)."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    view = memoryview(content)
+    for start in range(0, len(content), block_size):
+        text = decoder.decode(view[start:start + block_size])
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def chunk_text_file(content: bytes) -> List[str]:
+    """Chunk an uploaded text file, decoding as UTF-8 and falling back to latin-1."""
+    try:
+        return list(iter_chunks(iter_decoded_blocks(content, "utf-8")))
+    except UnicodeDecodeError:
+        # Try a different encoding if utf-8 fails
+        return list(iter_chunks(iter_decoded_blocks(content, "latin-1")))
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: python -m BackEnd.chunking [megabytes]
+    import sys
+    import time
+    import tracemalloc
+
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 8
+    sentence = "The mitochondria is the powerhouse of the cell, producing ATP through respiration. "
+    payload = (sentence * int(megabytes * 1024 * 1024 / len(sentence))).encode("utf-8")
+
+    def run(label, fn):
+        tracemalloc.start()
+        started = time.perf_counter()
+        count = fn()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label:<28} {count:>7} chunks  {elapsed * 1000:8.1f} ms  "
+              f"{len(payload) / elapsed / 1e6:7.1f} MB/s  peak {peak / 1e6:7.2f} MB")
+
+    print(f"input: {len(payload) / 1e6:.1f} MB (peak memory excludes the input bytes)")
+    unlimited = 10 ** 9
+
+    def whole_document():
+        # The previous in-request approach: collapse and split the entire document at once
+        normalized = re.sub(r"\s+", " ", payload.decode("utf-8").replace('\n', ' ')).strip()
+        sentences = re.split(r'(?<=[\.!?])\s+', normalized)
+        chunks, current, current_len = [], [], 0
+        for s in sentences:
+            if current_len + len(s) + 1 > 800 and current:
+                chunks.append(' '.join(current))
+                current, current_len = [s], len(s)
+            else:
+                current.append(s)
+                current_len += len(s) + 1
+        return len(chunks) + bool(current)
+
+    run("whole-document regex", whole_document)
+    run("streaming (chars)", lambda: sum(1 for _ in iter_chunks(iter_decoded_blocks(payload), StreamingChunker(800, unlimited))))
+    run("streaming (chars, overlap)", lambda: sum(1 for _ in iter_chunks(iter_decoded_blocks(payload), StreamingChunker(800, unlimited, overlap=160))))
+    run("streaming (tokens)", lambda: sum(1 for _ in iter_chunks(iter_decoded_blocks(payload), StreamingChunker(200, unlimited, size_unit="tokens"))))
@@ -0,0 +1,131 @@
+"""
+Embedding helpers for TutorApp
+Computes embeddings locally with the same function the study_materials collection uses.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from chromadb.utils import embedding_functions
+
+_embedding_function = None
+_ef_lock = threading.Lock()
+
+
+def get_embedding_function():
+    """Lazily create the shared embedding function (Chroma's default all-MiniLM-L6-v2 ONNX model)."""
+    global _embedding_function
+    if _embedding_function is None:
+        with _ef_lock:
+            if _embedding_function is None:
+                _embedding_function = embedding_functions.DefaultEmbeddingFunction()
+    return _embedding_function
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Embed a batch of texts, returning a (len(texts), dim) float32 array."""
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    vectors = get_embedding_function()(list(texts))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def normalize_query(text: str) -> str:
+    """Cache key for a query: whitespace collapsed and lowercased (the default model is uncased)."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class QueryEmbeddingCache:
+    """
+    LRU cache of query embeddings keyed on normalized query text.
+
+    Vectors are stored as read-only float32 arrays; entries are evicted least-recently-used
+    first when either `max_entries` or `max_bytes` is exceeded.
+    """
+
+    def __init__(self,
+                 max_entries: int = int(os.getenv("QUERY_EMBEDDING_CACHE_ENTRIES", "4096")),
+                 max_bytes: int = int(os.getenv("QUERY_EMBEDDING_CACHE_BYTES", str(16 * 1024 * 1024)))):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size_of(key: str, vector: np.ndarray) -> int:
+        return vector.nbytes + len(key)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: str, vector: np.ndarray) -> np.ndarray:
+        """Store a vector (converted to a read-only float32 array) and return the stored array."""
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        size = self._size_of(key, vector)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return vector
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= self._size_of(key, previous)
+            self._entries[key] = vector
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._size_of(oldest, evicted)
+                self.evictions += 1
+        return vector
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+query_embedding_cache = QueryEmbeddingCache()
+
+
+def embed_query(text: str) -> np.ndarray:
+    """
+    Embed a single query string, returning a read-only 1-D float32 array.
+
+    Repeated queries (same text up to case and whitespace) are served from
+    query_embedding_cache without running the embedding model.
+    """
+    key = normalize_query(text)
+    vector = query_embedding_cache.get(key)
+    if vector is None:
+        vector = query_embedding_cache.put(key, embed_texts([key])[0])
+    return vector
@@ -0,0 +1,65 @@
+"""
+Blocking I/O execution layer for TutorApp
+Runs synchronous Chroma and model calls in a bounded thread pool so they never stall the event loop.
+"""
+
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+# Number of worker threads available for blocking Chroma / model calls
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", "32"))
+# Maximum number of blocking calls allowed in flight at once (defaults to the pool size)
+BLOCKING_IO_CONCURRENCY = int(os.getenv("BLOCKING_IO_CONCURRENCY", str(BLOCKING_IO_WORKERS)))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Lazily create and return the shared thread pool used for blocking I/O."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=BLOCKING_IO_WORKERS,
+            thread_name_prefix="blocking-io"
+        )
+    return _executor
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(BLOCKING_IO_CONCURRENCY)
+    return _semaphore
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking callable in the shared thread pool and await its result.
+
+    Callers beyond BLOCKING_IO_CONCURRENCY wait on the event loop (not in a thread)
+    until a slot frees up, so a burst of slow calls cannot exhaust the pool.
+
+    Args:
+        func: The synchronous function to run
+        *args, **kwargs: Arguments forwarded to func
+
+    Returns:
+        Whatever func returns (exceptions are re-raised in the caller)
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(func, *args, **kwargs)
+    async with _get_semaphore():
+        return await loop.run_in_executor(get_executor(), call)
+
+
+def shutdown_executor():
+    """Shut down the shared thread pool (called on application shutdown)."""
+    global _executor, _semaphore
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+    _semaphore = None
@@ -0,0 +1,227 @@
+"""
+Background upload processing for TutorApp
+Accepts uploads immediately and parses, chunks and stores them in a bounded worker pool.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from .chromaConnection import get_record_quota
+from .chunking import StreamingChunker, chunk_text_file
+from .executor import run_blocking
+from .ingestion import apply_ingest, plan_ingest
+from .lexical_index import LexicalIndex
+from .pdf_extract import count_pdf_pages, iter_pdf_pages
+
+# Uploads processed at the same time; further jobs wait in the queue
+MAX_CONCURRENT_INGEST_JOBS = int(os.getenv("MAX_CONCURRENT_INGEST_JOBS", "2"))
+# Jobs allowed to wait or run at once before new uploads are rejected
+MAX_QUEUED_INGEST_JOBS = int(os.getenv("MAX_QUEUED_INGEST_JOBS", "20"))
+# Processes used for CPU-bound PDF parsing
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Finished jobs kept around for status polling
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "200"))
+
+
+class IngestError(Exception):
+    """Raised for uploads that cannot be processed (bad file, no text, quota exceeded)."""
+
+
+class IngestJob:
+    """Progress and outcome of one uploaded file."""
+
+    def __init__(self, filename: str, size_bytes: int):
+        self.job_id = f"job_{uuid.uuid4().hex[:12]}"
+        self.filename = filename
+        self.size_bytes = size_bytes
+        self.status = "queued"  # queued -> processing -> completed | failed
+        self.pages_total: Optional[int] = None
+        self.pages_parsed = 0
+        self.chunks_total: Optional[int] = None
+        self.chunks_stored = 0
+        self.added = 0
+        self.removed = 0
+        self.unchanged = 0
+        self.embedded = 0
+        self.reused = 0
+        # IDs of every chunk stored for the file, in document order, once the job completes
+        self.chunk_ids: List[str] = []
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "status": self.status,
+            "pages_total": self.pages_total,
+            "pages_parsed": self.pages_parsed,
+            "chunks_total": self.chunks_total,
+            "chunks_stored": self.chunks_stored,
+            "added": self.added,
+            "removed": self.removed,
+            "unchanged": self.unchanged,
+            "embedded": self.embedded,
+            "reused": self.reused,
+            "error": self.error,
+            "elapsed_seconds": round((self.finished_at or time.time()) - self.created_at, 2)
+        }
+
+
+class IngestJobManager:
+    """
+    Runs upload jobs in the background.
+
+    At most MAX_CONCURRENT_INGEST_JOBS jobs are processed at once; PDF parsing runs
+    in a process pool and Chroma/embedding work in the shared blocking I/O pool.
+    """
+
+    def __init__(self, collection, on_complete: Optional[Callable[[IngestJob], None]] = None,
+                 lexical_index: Optional[LexicalIndex] = None):
+        self.collection = collection
+        self.on_complete = on_complete
+        self.lexical_index = lexical_index
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_INGEST_JOBS)
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=PDF_PARSE_WORKERS)
+        return self._process_pool
+
+    def active_jobs(self) -> int:
+        return sum(1 for job in self._jobs.values() if not job.done)
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(job_id)
+
+    def submit(self, filename: str, content: bytes) -> IngestJob:
+        """
+        Queue an upload for background processing and return its job immediately.
+
+        Raises:
+            IngestError: If MAX_QUEUED_INGEST_JOBS jobs are already pending
+        """
+        if self.active_jobs() >= MAX_QUEUED_INGEST_JOBS:
+            raise IngestError("Too many uploads are being processed. Please try again shortly.")
+
+        job = IngestJob(filename, len(content))
+        self._jobs[job.job_id] = job
+        self._trim_history()
+        self._tasks[job.job_id] = asyncio.create_task(self._run(job, content))
+        return job
+
+    def _trim_history(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - INGEST_JOB_HISTORY)]:
+            del self._jobs[job_id]
+
+    async def _run(self, job: IngestJob, content: bytes) -> None:
+        async with self._semaphore:
+            job.status = "processing"
+            print(f"[ingest-job:{job.job_id}] processing {job.filename} ({job.size_bytes} bytes)")
+            try:
+                result = await self._process(job, content)
+                for field in ("added", "removed", "unchanged", "embedded", "reused"):
+                    setattr(job, field, result[field])
+                job.status = "completed"
+                print(f"[ingest-job:{job.job_id}] completed: {job.chunks_stored} chunks stored")
+                if self.on_complete:
+                    # The chunks are stored; a failing hook must not report the upload as failed
+                    try:
+                        self.on_complete(job)
+                    except Exception as hook_err:
+                        print(f"[ingest-job:{job.job_id}] on_complete hook failed: {hook_err}")
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                print(f"[ingest-job:{job.job_id}] failed: {e}")
+            finally:
+                job.finished_at = time.time()
+                self._tasks.pop(job.job_id, None)
+
+    async def _process(self, job: IngestJob, content: bytes) -> Dict[str, int]:
+        # Handle different file types
+        if job.filename.lower().endswith('.pdf'):
+            chunker = StreamingChunker.from_env()
+            chunks: List[str] = []
+            try:
+                job.pages_total = await run_blocking(count_pdf_pages, content)
+                if job.pages_total == 0:
+                    raise IngestError("The PDF file appears to be empty")
+
+                # Pages arrive in order while later page ranges are still being parsed;
+                # each page is chunked as it arrives instead of joining the whole document
+                async for _, page_text in iter_pdf_pages(content, self._get_process_pool(), job.pages_total):
+                    chunks.extend(chunker.feed(page_text + "\n"))
+                    job.pages_parsed += 1
+                    if chunker.full:
+                        # Chunk cap reached; the remaining pages would be dropped anyway
+                        break
+                chunks.extend(chunker.finish())
+            except IngestError:
+                raise
+            except Exception as pdf_error:
+                print(f"PDF processing error: {str(pdf_error)}")  # Debug log
+                raise IngestError(f"Error processing PDF file: {str(pdf_error)}")
+
+            if not chunks:
+                raise IngestError("Could not extract any text from the PDF file. The file might be scanned or contain only images.")
+        else:
+            chunks = await run_blocking(chunk_text_file, content)
+
+        if not chunks:
+            raise IngestError("No readable content found in file")
+        try:
+            plan = await run_blocking(plan_ingest, self.collection, chunks, job.filename)
+        except Exception as diff_err:
+            raise IngestError(f"Error reading stored chunks for {job.filename}: {str(diff_err)}")
+        job.chunks_total = len(plan.chunks)
+
+        # Check collection count and enforce a conservative quota to avoid cloud tenant limits;
+        # only records this upload adds beyond the ones it replaces count against it
+        try:
+            existing_count = await run_blocking(self.collection.count)
+        except Exception:
+            # If count isn't available, fall back to 0 to avoid blocking
+            existing_count = 0
+
+        chroma_quota = get_record_quota()
+        if chroma_quota is not None and plan.net_new_records > 0 and existing_count + plan.net_new_records > chroma_quota:
+            raise IngestError(
+                f"Quota exceeded: adding {plan.net_new_records} records would exceed the allowed number of records. "
+                f"Current usage: {existing_count}, quota limit: {chroma_quota}. "
+                "Reduce the number of chunks (increase CHUNK_SIZE_CHARS or set MAX_CHUNKS_PER_FILE), "
+                "or request a quota increase from your Chroma provider.")
+
+        def on_stored(count: int) -> None:
+            job.chunks_stored += count
+
+        try:
+            result = await run_blocking(apply_ingest, self.collection, plan,
+                                        progress=on_stored, index=self.lexical_index)
+        except Exception as add_err:
+            # Surface provider error (e.g., quota from cloud service)
+            raise IngestError(f"Error adding documents to vector DB: {str(add_err)}")
+        job.chunk_ids = list(plan.chunks)
+        return result
+
+    async def shutdown(self) -> None:
+        """Cancel running jobs and stop the PDF process pool."""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
@@ -0,0 +1,193 @@
+"""
+Ingestion pipeline for TutorApp
+Diffs uploads against what is stored for the same source and only embeds and writes changed chunks.
+"""
+
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from .embeddings import embed_texts
+from .lexical_index import LexicalIndex
+
+# Number of chunks embedded per call to the embedding model
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Worker threads embedding batches concurrently
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "4"))
+# Maximum records written per upsert call
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "500"))
+
+_embed_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_embed_executor() -> ThreadPoolExecutor:
+    global _embed_executor
+    if _embed_executor is None:
+        _embed_executor = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix="embed")
+    return _embed_executor
+
+
+def content_hash(text: str) -> str:
+    """Stable SHA-256 hex digest of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(source: str, text_hash: str) -> str:
+    """
+    Content-addressed record ID: the same text in the same source always maps to the same ID.
+
+    The source is part of the key so identical passages in different files stay separate
+    records (each file's manifest can then be diffed and deleted independently).
+    """
+    return hashlib.sha256(f"{source}\0{text_hash}".encode("utf-8")).hexdigest()[:32]
+
+
+def load_manifest(collection, source: str) -> Dict[str, Optional[int]]:
+    """Return {record ID: stored chunk_index (None for records written before it was kept)} for `source`."""
+    found = collection.get(where={"source": source}, include=["metadatas"])
+    return {
+        record_id: (metadata or {}).get('chunk_index')
+        for record_id, metadata in zip(found.get('ids') or [], found.get('metadatas') or [])
+    }
+
+
+class IngestPlan(NamedTuple):
+    """Difference between an upload and what is already stored for its source."""
+    source: str
+    chunks: Dict[str, str]  # chunk ID -> text, unique chunks of the upload in order
+    hashes: Dict[str, str]  # chunk ID -> content hash
+    added: List[str]        # IDs to embed and write
+    removed: List[str]      # stored IDs no longer in the upload
+    unchanged: int
+    moved: List[str]        # unchanged IDs whose stored chunk_index is no longer their position
+
+    @property
+    def net_new_records(self) -> int:
+        return len(self.added) - len(self.removed)
+
+
+def plan_ingest(collection, chunks: List[str], source: str) -> IngestPlan:
+    """
+    Compare the chunks of an upload with the source's manifest (blocking; run it via run_blocking).
+
+    Re-uploading an identical file yields an empty plan; an edited file only adds the
+    chunks whose text changed and removes the ones that disappeared. Records written
+    under the old positional IDs (`{source}-{i}`) are not in the new ID scheme, so the
+    first re-upload of such a file replaces them. Unchanged chunks that moved within the
+    file keep their record and only get their chunk_index updated.
+    """
+    unique: Dict[str, str] = {}
+    hashes: Dict[str, str] = {}
+    for text in chunks:
+        h = content_hash(text)
+        record_id = chunk_id(source, h)
+        if record_id not in unique:
+            unique[record_id] = text
+            hashes[record_id] = h
+
+    stored = load_manifest(collection, source)
+    added = [record_id for record_id in unique if record_id not in stored]
+    removed = [record_id for record_id in stored if record_id not in unique]
+    moved = [record_id for position, record_id in enumerate(unique)
+             if record_id in stored and stored[record_id] != position]
+    return IngestPlan(source, unique, hashes, added, removed, len(unique) - len(added), moved)
+
+
+def _lookup_existing_embeddings(collection, hashes: List[str]) -> Dict[str, List[float]]:
+    """Return {content_hash: embedding} for chunks already stored in the collection."""
+    if not hashes:
+        return {}
+    found = collection.get(
+        where={"content_hash": {"$in": hashes}},
+        include=["embeddings", "metadatas"]
+    )
+    existing = {}
+    embeddings = found.get('embeddings')
+    if embeddings is None:
+        return existing
+    for metadata, embedding in zip(found['metadatas'], embeddings):
+        existing.setdefault(metadata['content_hash'], [float(x) for x in embedding])
+    return existing
+
+
+def _embed_in_batches(texts: List[str]) -> List[List[float]]:
+    """Embed texts in EMBED_BATCH_SIZE batches spread across the embedding worker pool."""
+    batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+    vectors: List[List[float]] = []
+    for batch_vectors in _get_embed_executor().map(embed_texts, batches):
+        vectors.extend(batch_vectors.tolist())
+    return vectors
+
+
+def apply_ingest(collection, plan: IngestPlan,
+                 progress: Optional[Callable[[int], None]] = None,
+                 index: Optional[LexicalIndex] = None) -> Dict[str, int]:
+    """
+    Write an IngestPlan: delete removed chunks, then embed and upsert added ones (blocking).
+
+    Added chunks whose text is already stored (in any file) reuse the stored embedding;
+    only genuinely new text goes through the embedding model, in parallel batches.
+    Removed records are deleted first so the collection never exceeds its quota mid-update.
+    Every record carries its chunk_index (position in the upload), so a source's chunks
+    can be read back in document order.
+
+    Args:
+        progress: Optional callback receiving the number of chunks settled after each batch
+                  (unchanged chunks are reported up front)
+        index: Optional lexical index kept in step with the records written and deleted
+
+    Returns:
+        Counts of chunks in the upload, records added/removed/unchanged, newly embedded and reused
+    """
+    if progress and plan.unchanged:
+        progress(plan.unchanged)
+
+    for start in range(0, len(plan.removed), UPSERT_BATCH_SIZE):
+        collection.delete(ids=plan.removed[start:start + UPSERT_BATCH_SIZE])
+    if index is not None:
+        index.remove(plan.removed)
+
+    added_hashes = {plan.hashes[record_id] for record_id in plan.added}
+    known = _lookup_existing_embeddings(collection, list(added_hashes))
+    missing = [h for h in added_hashes if h not in known]
+    if missing:
+        texts = {plan.hashes[record_id]: plan.chunks[record_id] for record_id in plan.added}
+        for h, vector in zip(missing, _embed_in_batches([texts[h] for h in missing])):
+            known[h] = vector
+
+    positions = {record_id: i for i, record_id in enumerate(plan.chunks)}
+
+    def metadata(record_id: str) -> Dict:
+        return {"source": plan.source, "content_hash": plan.hashes[record_id], "chunk_index": positions[record_id]}
+
+    for start in range(0, len(plan.added), UPSERT_BATCH_SIZE):
+        ids = plan.added[start:start + UPSERT_BATCH_SIZE]
+        # Upsert keeps retries of a partially applied plan idempotent
+        collection.upsert(
+            ids=ids,
+            documents=[plan.chunks[record_id] for record_id in ids],
+            metadatas=[metadata(record_id) for record_id in ids],
+            embeddings=[known[plan.hashes[record_id]] for record_id in ids]
+        )
+        if index is not None:
+            index.add(ids, [plan.chunks[record_id] for record_id in ids])
+        if progress:
+            progress(len(ids))
+
+    # Metadata-only update: unchanged text keeps its record and embedding
+    for start in range(0, len(plan.moved), UPSERT_BATCH_SIZE):
+        ids = plan.moved[start:start + UPSERT_BATCH_SIZE]
+        collection.update(ids=ids, metadatas=[metadata(record_id) for record_id in ids])
+
+    print(f"[ingest] {plan.source}: {len(plan.added)} added, {len(plan.removed)} removed, "
+          f"{plan.unchanged} unchanged, {len(missing)} embedded")
+    return {
+        "chunks": len(plan.chunks),
+        "added": len(plan.added),
+        "removed": len(plan.removed),
+        "unchanged": plan.unchanged,
+        "embedded": len(missing),
+        "reused": len(plan.added) - len(missing)
+    }
+
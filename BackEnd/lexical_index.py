@@ -0,0 +1,204 @@
+"""
+Lexical Index for TutorApp
+In-process BM25 inverted index over the study_materials chunks, kept in sync at ingest time.
+"""
+
+import os
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or "
+    "that the their this to was were what when where which who why will with you your".split()
+)
+
+# Chunks read from Chroma per page when (re)building the index
+INDEX_BUILD_PAGE_SIZE = int(os.getenv("LEXICAL_INDEX_BUILD_PAGE_SIZE", "500"))
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric terms with common English stopwords removed."""
+    return [t for t in _TOKEN_PATTERN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class LexicalHit(NamedTuple):
+    """A chunk matched by the lexical index."""
+    id: str
+    score: float
+    matched_terms: int
+
+
+class LexicalIndex:
+    """
+    BM25 (Okapi) inverted index keyed by chunk ID.
+
+    Postings map each term to {chunk_id: term frequency}; chunk texts are kept so
+    lexical hits can be returned without a round-trip to Chroma. add() and remove()
+    are called by the ingestion pipeline, so the index follows uploads made through
+    this process; build_from() loads everything already in the collection at startup.
+    Removals that happen while a build is running are remembered, so the build never
+    re-adds a chunk an ingest has just deleted.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._documents: Dict[str, str] = {}
+        self._lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+        self.ready = False
+        # IDs removed while build_from() is running (None when no build is in progress)
+        self._removed_during_build: Optional[set] = None
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def _remove_locked(self, chunk_id: str) -> None:
+        terms = self._doc_terms.pop(chunk_id, None)
+        if terms is None:
+            return
+        self._documents.pop(chunk_id, None)
+        self._total_length -= self._lengths.pop(chunk_id, 0)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def _add_locked(self, chunk_id: str, text: str) -> None:
+        self._remove_locked(chunk_id)
+        terms = Counter(tokenize(text or ""))
+        self._doc_terms[chunk_id] = terms
+        self._documents[chunk_id] = text or ""
+        self._lengths[chunk_id] = sum(terms.values())
+        self._total_length += self._lengths[chunk_id]
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[chunk_id] = tf
+
+    def add(self, ids: Iterable[str], documents: Iterable[str]) -> None:
+        """Index (or re-index) chunks."""
+        with self._lock:
+            for chunk_id, text in zip(ids, documents):
+                self._add_locked(chunk_id, text)
+                if self._removed_during_build is not None:
+                    # Re-added by an ingest, so it is live again
+                    self._removed_during_build.discard(chunk_id)
+
+    def remove(self, ids: Iterable[str]) -> None:
+        """Drop chunks from the index."""
+        with self._lock:
+            for chunk_id in ids:
+                self._remove_locked(chunk_id)
+                if self._removed_during_build is not None:
+                    self._removed_during_build.add(chunk_id)
+
+    def _add_from_build(self, ids: List[str], documents: List[str]) -> None:
+        """Add chunks read by build_from(), skipping any removed since the build started."""
+        with self._lock:
+            for chunk_id, text in zip(ids, documents):
+                if chunk_id not in self._removed_during_build:
+                    self._add_locked(chunk_id, text)
+
+    def document(self, chunk_id: str) -> Optional[str]:
+        return self._documents.get(chunk_id)
+
+    def build_from(self, collection) -> int:
+        """
+        Load every chunk stored in `collection` into the index (blocking; run it via run_blocking).
+
+        Pages are read without holding the lock, so an ingest can delete chunks meanwhile.
+        Those deletions are recorded and filtered out of every page before it is added.
+        They also shift the offsets of later pages, so when any happened the collection's
+        IDs are listed again and chunks the paging skipped are fetched by ID.
+
+        Returns:
+            Number of chunks indexed
+        """
+        with self._lock:
+            self._removed_during_build = set()
+        try:
+            offset = 0
+            while True:
+                page = collection.get(limit=INDEX_BUILD_PAGE_SIZE, offset=offset, include=["documents"])
+                ids = page.get('ids') or []
+                if not ids:
+                    break
+                self._add_from_build(ids, page.get('documents') or [""] * len(ids))
+                offset += len(ids)
+                if len(ids) < INDEX_BUILD_PAGE_SIZE:
+                    break
+
+            if self._removed_during_build:
+                self._add_skipped(collection)
+        finally:
+            with self._lock:
+                self._removed_during_build = None
+        self.ready = True
+        print(f"[lexical-index] indexed {len(self)} chunks, {len(self._postings)} terms")
+        return len(self)
+
+    def _add_skipped(self, collection) -> None:
+        """Fetch chunks that offset paging skipped because rows were deleted mid-build."""
+        stored: List[str] = []
+        offset = 0
+        while True:
+            page = collection.get(limit=INDEX_BUILD_PAGE_SIZE, offset=offset, include=[])
+            ids = page.get('ids') or []
+            stored.extend(ids)
+            offset += len(ids)
+            if len(ids) < INDEX_BUILD_PAGE_SIZE:
+                break
+        with self._lock:
+            missing = [chunk_id for chunk_id in stored if chunk_id not in self._documents]
+        for start in range(0, len(missing), INDEX_BUILD_PAGE_SIZE):
+            batch = collection.get(ids=missing[start:start + INDEX_BUILD_PAGE_SIZE], include=["documents"])
+            ids = batch.get('ids') or []
+            self._add_from_build(ids, batch.get('documents') or [""] * len(ids))
+        if missing:
+            print(f"[lexical-index] picked up {len(missing)} chunks skipped by concurrent deletes")
+
+    def search(self, query: str, limit: int = 10) -> List[LexicalHit]:
+        """
+        Return up to `limit` chunks ranked by BM25 score for `query`.
+
+        Each hit also reports how many distinct query terms the chunk contains.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            doc_count = len(self._documents)
+            if doc_count == 0:
+                return []
+            avg_length = self._total_length / doc_count
+            scores: Dict[str, float] = {}
+            matched: Dict[str, int] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    norm = tf + self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+                    matched[chunk_id] = matched.get(chunk_id, 0) + 1
+
+        ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [LexicalHit(chunk_id, score, matched[chunk_id]) for chunk_id, score in ranked]
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "chunks": len(self._documents),
+            "terms": len(self._postings)
+        }
@@ -0,0 +1,134 @@
+"""
+Load test for TutorApp
+Checks that concurrent chat requests overlap instead of queueing behind each other's blocking calls.
+
+Chroma (retrieval and chat history) and the model are replaced with stubs that sleep, so the
+test needs no credentials and measures only how the app schedules the work:
+
+    python -m BackEnd.load_test --requests 20
+
+N concurrent /api/chat/thread/{id}/message requests should finish in roughly the time of one,
+and /api/health should answer promptly while they are in flight.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+project_root = str(Path(__file__).parents[1])
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+# Nothing from the run should reach disk
+os.environ["RESULT_STORE_PATH"] = ""
+
+from fastapi.testclient import TestClient
+
+from BackEnd import main
+from BackEnd import chat_memory as chat_memory_module
+from BackEnd import model_service
+from BackEnd.retrieval import RetrievalResult
+
+CHROMA_DELAY = 0.2  # seconds per stubbed (blocking) Chroma call
+MODEL_DELAY = 0.5   # seconds per stubbed (async) model call
+
+
+class _StubCollection:
+    """Empty collection: enough for the startup tasks (lexical index, quiz manifest)."""
+
+    def count(self):
+        return 0
+
+    def get(self, *args, **kwargs):
+        return {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+
+
+class _StubChromaClient:
+    def get_or_create_collection(self, *args, **kwargs):
+        return _StubCollection()
+
+
+class _SlowChatMemory:
+    """ChatMemoryManager stand-in whose calls block like Chroma round-trips."""
+
+    def add_message(self, thread_id, role, content, session_id=None):
+        time.sleep(CHROMA_DELAY)
+        return "message"
+
+    def get_recent_context(self, thread_id, max_messages=10):
+        time.sleep(CHROMA_DELAY)
+        return ""
+
+    def get_message_count(self, thread_id):
+        return 1
+
+    def pending_summary(self, thread_id):
+        return None
+
+
+def _slow_retrieve(collection, text, n_results=5, index=None):
+    time.sleep(CHROMA_DELAY)
+    return RetrievalResult(["Stub study material."], ["stub-0"], None)
+
+
+async def _slow_model(prompt, chunks, conversation_history=None):
+    await asyncio.sleep(MODEL_DELAY)
+    return "Stub answer."
+
+
+def _install_stubs() -> None:
+    main.get_chroma_client = lambda: _StubChromaClient()
+    main.get_embedding_function = lambda: None
+    main.retrieve = _slow_retrieve
+    chat_memory_module.ChatMemoryManager = _SlowChatMemory
+    model_service.get_ai_response_async = _slow_model
+
+
+def _send(client: TestClient, i: int) -> float:
+    started = time.perf_counter()
+    response = client.post(f"/api/chat/thread/load-{i}/message", json={"text": f"Question {i}?"})
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+def run(requests: int, tolerance: float) -> bool:
+    """
+    Time one request alone, then `requests` at once, probing /api/health meanwhile.
+
+    Returns:
+        True if the concurrent batch finished within `tolerance` x the single-request time
+    """
+    _install_stubs()
+    with TestClient(main.app) as client:
+        single = _send(client, 0)
+
+        with ThreadPoolExecutor(max_workers=requests + 1) as pool:
+            started = time.perf_counter()
+            futures = [pool.submit(_send, client, i) for i in range(1, requests + 1)]
+            # Probe health once the chats are underway
+            time.sleep(CHROMA_DELAY / 2)
+            health_started = time.perf_counter()
+            client.get("/api/health").raise_for_status()
+            health = time.perf_counter() - health_started
+            latencies = [f.result() for f in futures]
+            wall = time.perf_counter() - started
+
+    print(f"single request:          {single:.2f}s")
+    print(f"{requests} concurrent requests: {wall:.2f}s wall (slowest {max(latencies):.2f}s)")
+    print(f"/api/health under load:  {health * 1000:.0f}ms")
+    passed = wall <= single * tolerance
+    print("PASS" if passed else f"FAIL: concurrent wall time exceeds {tolerance}x a single request")
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20, help="concurrent chat requests")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="allowed ratio of concurrent wall time to single-request time")
+    args = parser.parse_args()
+    sys.exit(0 if run(args.requests, args.tolerance) else 1)
@@ -16,13 +16,21 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List
-import re
+from typing import Dict, List
+import json
 import uvicorn
-from BackEnd.chromaConnection import get_chroma_client
-import io
-from PyPDF2 import PdfReader
+from BackEnd.chromaConnection import get_chroma_client, get_backend_name
+from BackEnd.executor import run_blocking, shutdown_executor
+from BackEnd.retrieval import retrieve, RetrievalResult
+from BackEnd.lexical_index import LexicalIndex
+from BackEnd.response_cache import SemanticResponseCache
+from BackEnd.embeddings import get_embedding_function, query_embedding_cache
+from BackEnd.ingest_jobs import IngestJobManager, IngestJob, IngestError
+from BackEnd.quiz_engine import QuizEngine, QuizError
+from BackEnd.result_store import ResultStore, RESULT_STORE_ANSWERS
+from BackEnd.metrics import metrics, span, RequestTimingMiddleware
 from dotenv import load_dotenv
 
 # Load environment variables early (explicitly load BackEnd/.env so running uvicorn from repo root still finds it)
@@ -53,18 +61,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-route request latency, exposed with the per-stage timings at /api/metrics
+app.add_middleware(RequestTimingMiddleware)
 
 # Collection will be created on startup once the Chroma client is available
 collection = None
 chat_memory = None
+ingest_jobs = None  # IngestJobManager
+quiz_engine = None  # QuizEngine
+result_store = None  # ResultStore, or None when RESULT_STORE_PATH is empty
 
-# Quiz pre-generation cache/state
-pre_generated_quiz = None  # {"quiz": str, "used_docs": int}
-pre_generated_quiz_error = None  # str
-pre_generated_quiz_task = None  # asyncio.Task
-pre_generated_quiz_timestamp = None  # float epoch seconds
-QUIZ_CACHE_MAX_AGE = int(os.getenv("QUIZ_CACHE_MAX_AGE", "900"))  # seconds
-_quiz_generation_lock = asyncio.Lock()
+# BM25 index over study_materials, fused with vector search at query time
+lexical_index = LexicalIndex()
+
+# Answers to repeated questions, keyed on query embedding + retrieved chunk IDs
+response_cache = SemanticResponseCache()
 
 
 @app.on_event("startup")
@@ -73,101 +84,63 @@ async def startup_event():
 
     Using async startup lets us schedule a background task without blocking import.
     """
-    global collection, chat_memory, pre_generated_quiz_task
+    global collection, chat_memory, ingest_jobs, quiz_engine, result_store
     client = get_chroma_client()
     collection = client.get_or_create_collection(
         name="study_materials",
-        metadata={"hnsw:space": "cosine"}
+        metadata={"hnsw:space": "cosine"},
+        embedding_function=get_embedding_function()
     )
 
     from BackEnd.chat_memory import ChatMemoryManager
     chat_memory = ChatMemoryManager()
 
-    # Fire off initial background quiz pre-generation
-    pre_generated_quiz_task = asyncio.create_task(_background_generate_quiz(initial=True))
+    ingest_jobs = IngestJobManager(collection, on_complete=_on_ingest_complete, lexical_index=lexical_index)
+    result_store = ResultStore.from_env()
+    quiz_engine = QuizEngine(collection, store=result_store)
 
-def _build_quiz_sync():
-    """Synchronous helper that constructs quiz payload (used by background + endpoint).
+    # Until the lexical index is loaded, queries fall back to vector search only
+    asyncio.create_task(_build_lexical_index())
 
-    Returns dict {"quiz": str, "used_docs": int}
-    Raises HTTPException for expected client errors.
-    """
-    from fastapi import HTTPException
-    from BackEnd.model_service import get_ai_response
-    global collection
-    if collection is None:
-        raise HTTPException(status_code=503, detail="Search collection is not initialized yet")
+    # Restore stored quizzes/answers, then generate quizzes only for sources without one
+    asyncio.create_task(_restore_results())
 
-    count = collection.count()
-    if count == 0:
-        raise HTTPException(status_code=400, detail="No documents available. Please upload study materials first.")
-
-    max_docs = int(os.getenv("QUIZ_MAX_DOCS", "60"))
-    per_doc_char_limit = int(os.getenv("QUIZ_PER_DOC_CHAR_LIMIT", "600"))
-    total_char_budget = int(os.getenv("QUIZ_TOTAL_CHAR_BUDGET", "16000"))
-
-    print(f"[quiz-preload] total collection count={count}; retrieving up to {min(count, max_docs)} docs")
-    results = collection.get(limit=min(count, max_docs), include=["documents"])
-    docs_raw = results.get("documents") if results else None
-    if not docs_raw:
-        raise HTTPException(status_code=400, detail="Could not retrieve documents from database")
-
-    flat_docs = []
-    for d in docs_raw:
-        if isinstance(d, list):
-            flat_docs.extend([str(x) for x in d if x])
-        elif d:
-            flat_docs.append(str(d))
-    if not flat_docs:
-        raise HTTPException(status_code=400, detail="No document text retrieved from database")
-
-    trimmed = []
-    budget_left = total_char_budget
-    for doc in flat_docs:
-        if budget_left <= 0:
-            break
-        snippet = doc[:per_doc_char_limit]
-        if len(snippet) > budget_left:
-            snippet = snippet[:max(0, budget_left)]
-        if snippet:
-            trimmed.append(snippet)
-            budget_left -= len(snippet)
-    if not trimmed:
-        raise HTTPException(status_code=400, detail="Content budget exhausted while preparing quiz context")
-
-    quiz_prompt = (
-        "Create a 20-question study quiz from the provided course materials. "
-        "Diversify types (concept recall, short answer, application). "
-        "Return STRICT JSON with: {\"questions\":[{\"question\":string,\"answer\":string}...]}. "
-        "Keep questions self-contained and answers concise with a 1–2 sentence explanation."
-    )
 
-    print(f"[quiz-preload] sending {len(trimmed)} docs; total_chars={sum(len(t) for t in trimmed)} budget_left={budget_left}")
-    response = get_ai_response(quiz_prompt, trimmed)
-    print(f"[quiz-preload] model response length={len(response)}")
-    return {"quiz": response, "used_docs": len(trimmed)}
+async def _build_lexical_index():
+    try:
+        await run_blocking(lexical_index.build_from, collection)
+    except Exception as e:
+        print(f"[lexical-index] build failed, using vector search only: {e}")
 
-async def _background_generate_quiz(initial=False):
-    """Background task to populate the pre-generated quiz cache.
 
-    Errors are stored in global state; call /api/quiz/status to inspect.
-    """
-    global pre_generated_quiz, pre_generated_quiz_error, pre_generated_quiz_timestamp
-    async with _quiz_generation_lock:
-        phase = "initial" if initial else "regenerate"
-        print(f"[quiz-bg] starting {phase} background quiz generation")
-        pre_generated_quiz_error = None
+async def _restore_results():
+    try:
+        await quiz_engine.load()
+        if result_store is not None and RESULT_STORE_ANSWERS:
+            entries = await run_blocking(result_store.load_answers, quiz_engine.corpus_version,
+                                         response_cache.max_entries)
+            print(f"[result-store] restored {response_cache.warm(entries)} cached answers")
+    except Exception as e:
+        print(f"[result-store] restore failed: {e}")
+    quiz_engine.start_refresh()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background upload jobs and release the worker pools and model connections."""
+    if ingest_jobs is not None:
+        await ingest_jobs.shutdown()
+    if result_store is not None:
+        result_store.close()
+    # model_service is imported on first use; if it never was, there is no client to close
+    if "BackEnd.model_service" in sys.modules:
         try:
-            # Run sync logic off the event loop to avoid blocking
-            payload = await asyncio.to_thread(_build_quiz_sync)
-            pre_generated_quiz = payload
-            pre_generated_quiz_timestamp = time.time()
-            print(f"[quiz-bg] {phase} background quiz generation complete")
-        except Exception as e:  # HTTPException or other
-            pre_generated_quiz_error = str(e)
-            pre_generated_quiz = None
-            pre_generated_quiz_timestamp = None
-            print(f"[quiz-bg] {phase} background quiz generation failed: {e}")
+            await sys.modules["BackEnd.model_service"].aclose()
+        except Exception as e:
+            print(f"[shutdown] closing the model client failed: {e}")
+    shutdown_executor()
+
+NO_RESULTS_MESSAGE = "I couldn't find any relevant information in the uploaded documents."
 
 class ChatQuery(BaseModel):
     text: str
@@ -185,12 +158,70 @@ async def create_new_thread():
         if chat_memory is None:
             raise HTTPException(status_code=503, detail="Chat memory service is not initialized yet")
 
-        thread_id = chat_memory.create_thread()
+        thread_id = await run_blocking(chat_memory.create_thread)
         return {"thread_id": thread_id, "message": "New chat thread created"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _search_documents(text: str, log_tag: str) -> RetrievalResult:
+    """Query the study_materials collection and return cleaned chunks, their IDs and the query embedding.
+
+    Raises HTTPException(500) if the vector search itself fails.
+    """
+    print(f"[{log_tag}] incoming text length={len(text)}")
+    try:
+        # Get top 5 most relevant documents for better context
+        with span("retrieval"):
+            return await run_blocking(retrieve, collection, text, n_results=5, index=lexical_index)
+    except Exception as chroma_err:
+        print(f"[{log_tag}] Chroma query failed: {chroma_err}")
+        raise HTTPException(status_code=500, detail=f"Vector search failed: {chroma_err}")
+
+
+async def _generate_answer(text: str, result: RetrievalResult, log_tag: str,
+                           conversation_history: str = None, cacheable: bool = True) -> str:
+    """Answer `text` from the retrieved chunks, serving it from the semantic response cache when possible.
+
+    Only answers that don't depend on earlier conversation turns should be cacheable.
+    """
+    if cacheable:
+        with span("response_cache.lookup"):
+            cached = response_cache.lookup(result.query_embedding, result.ids)
+        if cached is not None:
+            print(f"[{log_tag}] semantic cache hit")
+            return cached
+
+    from BackEnd.model_service import get_ai_response_async, is_error_response
+    print(f"[{log_tag}] sending {len(result.documents)} docs to model; total_chars={sum(len(c) for c in result.documents)}")
+    started = time.perf_counter()
+    try:
+        with span("answer"):
+            response = await get_ai_response_async(text, result.documents, conversation_history=conversation_history)
+        print(f"[{log_tag}] model response length={len(response)}")
+    except Exception as model_err:
+        print(f"[{log_tag}] model error: {model_err}")
+        raise HTTPException(status_code=500, detail=f"Model error: {model_err}")
+
+    if cacheable and not is_error_response(response):
+        await _cache_answer(result, response, time.perf_counter() - started)
+    return response
+
+
+async def _cache_answer(result: RetrievalResult, response: str, model_seconds: float) -> None:
+    """Store an answer in the semantic response cache and, if enabled, the on-disk result store."""
+    response_cache.store(result.query_embedding, result.ids, response, model_seconds)
+    if result_store is None or not RESULT_STORE_ANSWERS or result.query_embedding is None:
+        return
+    if quiz_engine is None or quiz_engine.corpus_version is None:
+        return
+    try:
+        await run_blocking(result_store.save_answer, quiz_engine.corpus_version, result.query_embedding,
+                           result.ids, response, model_seconds)
+    except Exception as e:
+        print(f"[result-store] answer write failed: {e}")
+
+
 @app.post("/api/chat/thread/{thread_id}/message")
 async def send_thread_message(thread_id: str, query: ChatQuery):
     """
@@ -204,82 +235,176 @@ async def send_thread_message(thread_id: str, query: ChatQuery):
             raise HTTPException(status_code=503, detail="Search collection is not initialized yet")
 
         # Add user message to thread history
-        chat_memory.add_message(thread_id, "user", query.text)
+        await run_blocking(chat_memory.add_message, thread_id, "user", query.text)
 
         # Search the collection for relevant documents
-        print(f"[thread:{thread_id}] incoming text length={len(query.text)}")
-        try:
-            results = collection.query(
-                query_texts=[query.text],
-                n_results=5
-            )
-        except Exception as chroma_err:
-            print(f"[thread:{thread_id}] Chroma query failed: {chroma_err}")
-            raise HTTPException(status_code=500, detail=f"Vector search failed: {chroma_err}")
-
-        if results and results.get('documents') and results['documents'][0]:
-            docs = results['documents'][0]
-            # Normalize whitespace in returned docs
-            cleaned = []
-            for d in docs:
-                if not d:
-                    continue
-                txt = re.sub(r"_+", " ", d)
-                txt = re.sub(r"\s{2,}", " ", txt).strip()
-                cleaned.append(txt)
-
-            if not cleaned:
-                response_text = "I couldn't find any relevant information in the uploaded documents."
-                chat_memory.add_message(thread_id, "assistant", response_text)
-                return {"message": response_text}
-
-            # Get recent conversation context
-            context = chat_memory.get_recent_context(thread_id, max_messages=8)
-
-            # Use the model to generate a response with conversation context
-            from BackEnd.model_service import get_ai_response
-            print(f"[thread:{thread_id}] sending {len(cleaned)} docs + conversation history")
-            try:
-                response = get_ai_response(query.text, cleaned, conversation_history=context)
-                print(f"[thread:{thread_id}] model response length={len(response)}")
-            except Exception as model_err:
-                print(f"[thread:{thread_id}] model error: {model_err}")
-                raise HTTPException(status_code=500, detail=f"Model error: {model_err}")
+        result = await _search_documents(query.text, f"thread:{thread_id}")
+        if not result.documents:
+            await run_blocking(chat_memory.add_message, thread_id, "assistant", NO_RESULTS_MESSAGE)
+            _schedule_summary(thread_id)
+            return {"message": NO_RESULTS_MESSAGE}
+
+        # Get recent conversation context
+        context = await run_blocking(chat_memory.get_recent_context, thread_id, max_messages=8)
+        # Only the opening question of a thread is independent of earlier turns
+        first_turn = await run_blocking(chat_memory.get_message_count, thread_id) <= 1
+
+        # Use the model to generate a response with conversation context
+        response = await _generate_answer(query.text, result, f"thread:{thread_id}",
+                                          conversation_history=context, cacheable=first_turn)
+
+        # Add assistant response to thread history
+        await run_blocking(chat_memory.add_message, thread_id, "assistant", response)
+        _schedule_summary(thread_id)
+
+        return {"message": response}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-            # Add assistant response to thread history
-            chat_memory.add_message(thread_id, "assistant", response)
 
-            return {"message": response}
-        else:
-            response_text = "I couldn't find any relevant information in the uploaded documents."
-            chat_memory.add_message(thread_id, "assistant", response_text)
-            return {"message": response_text}
+# Rolling summary updates in flight, at most one per thread
+_summary_tasks: Dict[str, asyncio.Task] = {}
+
+
+def _schedule_summary(thread_id: str) -> None:
+    """Fold older turns of a thread into its rolling summary in the background, off the request path."""
+    if chat_memory is None or thread_id in _summary_tasks:
+        return
+    _summary_tasks[thread_id] = asyncio.create_task(_summarize_thread(thread_id))
+
+
+async def _summarize_thread(thread_id: str) -> None:
+    from BackEnd.model_service import summarize_conversation
+    try:
+        pending = await run_blocking(chat_memory.pending_summary, thread_id)
+        if pending is None:
+            return
+        previous, transcript, through = pending
+        started = time.perf_counter()
+        summary = await summarize_conversation(previous, transcript)
+        if summary and await run_blocking(chat_memory.save_summary, thread_id, summary, through):
+            print(f"[summary:{thread_id}] summarized messages before #{through} in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        print(f"[summary:{thread_id}] failed: {e}")
+    finally:
+        _summary_tasks.pop(thread_id, None)
+
+
+async def _persist_reply(thread_id: str, response: str) -> None:
+    """Store an assistant reply and schedule the thread's summary update."""
+    try:
+        await run_blocking(chat_memory.add_message, thread_id, "assistant", response)
+        _schedule_summary(thread_id)
+    except Exception as e:
+        print(f"[thread-stream:{thread_id}] failed to store assistant message: {e}")
+
+
+def _sse_event(data: dict, event: str = None) -> str:
+    """Format a Server-Sent Events frame carrying a JSON payload."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/chat/thread/{thread_id}/message/stream")
+async def stream_thread_message(thread_id: str, query: ChatQuery):
+    """
+    Streaming variant of send_thread_message, delivered as Server-Sent Events.
+
+    Emits one `data: {"token": ...}` frame per model delta as it arrives, then a final
+    `event: done` frame carrying the full message. If the model fails, an `event: error`
+    frame ({"detail": ...}) precedes `done`; the error text is never part of the message.
+    The assembled assistant message is stored in the thread history once the stream ends.
+    """
+    if chat_memory is None:
+        raise HTTPException(status_code=503, detail="Chat memory service is not initialized yet")
+    if collection is None:
+        raise HTTPException(status_code=503, detail="Search collection is not initialized yet")
+
+    try:
+        await run_blocking(chat_memory.add_message, thread_id, "user", query.text)
+        result = await _search_documents(query.text, f"thread-stream:{thread_id}")
+        context = ""
+        first_turn = False
+        if result.documents:
+            context = await run_blocking(chat_memory.get_recent_context, thread_id, max_messages=8)
+            first_turn = await run_blocking(chat_memory.get_message_count, thread_id) <= 1
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    from BackEnd.model_service import stream_ai_response, ModelStreamError
+
+    cached = response_cache.lookup(result.query_embedding, result.ids) if first_turn else None
+
+    async def event_stream():
+        if not result.documents or cached is not None:
+            response = NO_RESULTS_MESSAGE if cached is None else cached
+            await asyncio.shield(_persist_reply(thread_id, response))
+            yield _sse_event({"token": response})
+            yield _sse_event({"message": response}, event="done")
+            return
+
+        print(f"[thread-stream:{thread_id}] streaming {len(result.documents)} docs + conversation history")
+        parts: List[str] = []
+        error = None
+        started = time.perf_counter()
+        try:
+            try:
+                async for token in stream_ai_response(query.text, result.documents, conversation_history=context):
+                    parts.append(token)
+                    yield _sse_event({"token": token})
+            except ModelStreamError as e:
+                error = str(e)
+        finally:
+            # Persist whatever the model produced, even if the client disconnected mid-stream.
+            # Shielded: a disconnect cancels this task, but the write and summary still run.
+            response = "".join(parts)
+            print(f"[thread-stream:{thread_id}] model response length={len(response)}")
+            if response:
+                await asyncio.shield(_persist_reply(thread_id, response))
+        if error is not None:
+            yield _sse_event({"detail": error}, event="error")
+        elif first_turn and response:
+            await _cache_answer(result, response, time.perf_counter() - started)
+        yield _sse_event({"message": response}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
 @app.get("/api/chat/thread/{thread_id}/history")
-async def get_thread_history(thread_id: str, limit: int = None):
-    """Get the message history for a specific thread."""
+async def get_thread_history(thread_id: str, limit: int = None, before: int = None):
+    """Get the message history for a specific thread.
+
+    Pass `limit` to page backwards from the newest message; the response's `next_cursor`
+    is the `before` value for the next (older) page, or null when there is none.
+    """
     try:
         if chat_memory is None:
             raise HTTPException(status_code=503, detail="Chat memory service is not initialized yet")
 
-        history = chat_memory.get_thread_history(thread_id, limit=limit)
-        return {"thread_id": thread_id, "messages": history}
+        history = await run_blocking(chat_memory.get_thread_history, thread_id, limit=limit, before=before)
+        next_cursor = None
+        if limit and len(history) == limit and history[0]['message_index'] > 1:
+            next_cursor = history[0]['message_index']
+        return {"thread_id": thread_id, "messages": history, "next_cursor": next_cursor}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/chat/threads")
-async def list_threads():
-    """List all available chat threads."""
+async def list_threads(session_id: str = None, limit: int = None, offset: int = 0):
+    """List chat threads (most recent first), optionally filtered by session and paginated."""
     try:
         if chat_memory is None:
             raise HTTPException(status_code=503, detail="Chat memory service is not initialized yet")
 
-        threads = chat_memory.list_threads()
-        return {"threads": threads}
+        threads = await run_blocking(chat_memory.list_threads, session_id=session_id, limit=limit, offset=offset)
+        return {"threads": threads, "offset": offset, "limit": limit}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -291,7 +416,7 @@ async def delete_thread(thread_id: str):
         if chat_memory is None:
             raise HTTPException(status_code=503, detail="Chat memory service is not initialized yet")
 
-        success = chat_memory.delete_thread(thread_id)
+        success = await run_blocking(chat_memory.delete_thread, thread_id)
         if success:
             return {"message": f"Thread {thread_id} deleted successfully"}
         else:
@@ -300,6 +425,14 @@ async def delete_thread(thread_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/chat/cache/stats")
+async def chat_cache_stats():
+    """Hit, miss and eviction counters for the in-process thread history cache."""
+    if chat_memory is None:
+        raise HTTPException(status_code=503, detail="Chat memory service is not initialized yet")
+    return chat_memory.cache.stats()
+
+
 # === Original Endpoints (Legacy - kept for backward compatibility) ===
 
 @app.post("/api/query/")
@@ -309,45 +442,31 @@ async def query_documents(query: ChatQuery):
             raise HTTPException(status_code=503, detail="Search collection is not initialized yet")
 
         # Search the collection for relevant documents
-        print(f"[query] incoming text length={len(query.text)}")
-        try:
-            results = collection.query(
-                query_texts=[query.text],
-                n_results=5  # Get top 5 most relevant documents for better context
-            )
-        except Exception as chroma_err:
-            print(f"[query] Chroma query failed: {chroma_err}")
-            raise HTTPException(status_code=500, detail=f"Vector search failed: {chroma_err}")
-        
-        if results and results.get('documents') and results['documents'][0]:
-            docs = results['documents'][0]
-            # Normalize whitespace in returned docs
-            cleaned = []
-            for d in docs:
-                if not d:
-                    continue
-                txt = re.sub(r"_+", " ", d)
-                txt = re.sub(r"\s{2,}", " ", txt).strip()
-                cleaned.append(txt)
-
-            if not cleaned:
-                return {"message": "I couldn't find any relevant information in the uploaded documents."}
-            
-            # Use the model to generate a response based on the chunks and query
-            from BackEnd.model_service import get_ai_response
-            print(f"[query] sending {len(cleaned)} cleaned docs to model; total_chars={sum(len(c) for c in cleaned)}")
-            try:
-                response = get_ai_response(query.text, cleaned)
-                print(f"[query] model response length={len(response)}")
-            except Exception as model_err:
-                print(f"[query] model error: {model_err}")
-                raise HTTPException(status_code=500, detail=f"Model error: {model_err}")
-            return {"message": response}
-        else:
-            return {"message": "I couldn't find any relevant information in the uploaded documents."}
+        result = await _search_documents(query.text, "query")
+        if not result.documents:
+            return {"message": NO_RESULTS_MESSAGE}
+
+        # Use the model to generate a response based on the chunks and query
+        response = await _generate_answer(query.text, result, "query")
+        return {"message": response}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/query/cache/stats")
+async def response_cache_stats():
+    """Hit rate and saved model time for the semantic response cache."""
+    return response_cache.stats()
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Request and stage latency histograms (with p50/p95/p99) and model token counts, in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/query/embedding-cache/stats")
+async def query_embedding_cache_stats():
+    """Hit rate and memory use of the query embedding cache."""
+    return query_embedding_cache.stats()
+
 @app.get("/api/health")
 async def health():
     """Simple health and configuration check for troubleshooting."""
@@ -356,23 +475,41 @@ async def health():
         count = None
         if initialized:
             try:
-                count = collection.count()
+                count = await run_blocking(collection.count)
             except Exception:
                 count = None
         return {
             "status": "ok",
             "collection_initialized": initialized,
             "document_count": count,
+            "vector_backend": get_backend_name(),
+            "lexical_index": lexical_index.stats(),
+            "result_store": await run_blocking(result_store.stats) if result_store is not None else None,
             "allowed_origins": allowed_origins,
         }
     except Exception as e:
         # Even if something fails, return a 200 with info to avoid CORS masking
         return {"status": "degraded", "error": str(e), "allowed_origins": allowed_origins}
 
-@app.post("/api/upload/")
+def _on_ingest_complete(job: IngestJob) -> None:
+    # New material can change the best answer to any question; a re-upload of
+    # unchanged content leaves every stored chunk (and answer) as it was
+    if job.added or job.removed:
+        response_cache.clear()
+        # Answers cached from now on are tagged with the new corpus version
+        quiz_engine.update_source(job.filename, job.chunk_ids)
+        # Only the uploaded file's quiz is regenerated, once uploads have settled
+        quiz_engine.schedule_refresh([job.filename])
+
+
+@app.post("/api/upload/", status_code=202)
 async def upload_file(file: UploadFile = File(...)):
+    """Accept an upload and process it in the background.
+
+    Returns a job_id right away; poll /api/upload/{job_id} for progress.
+    """
     try:
-        if collection is None:
+        if collection is None or ingest_jobs is None:
             raise HTTPException(status_code=503, detail="Search collection is not initialized yet")
 
         if not file.filename:
@@ -382,109 +519,32 @@ async def upload_file(file: UploadFile = File(...)):
         if not content:
             raise HTTPException(status_code=400, detail="The uploaded file is empty")
 
-        text_content = ""
-        
-        # Handle different file types
-        if file.filename.lower().endswith('.pdf'):
-            try:
-                # Process PDF file
-                pdf_file = io.BytesIO(content)
-                pdf_reader = PdfReader(pdf_file)
-                
-                if len(pdf_reader.pages) == 0:
-                    raise HTTPException(status_code=400, detail="The PDF file appears to be empty")
-                
-                # Extract text from all pages
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_content += page_text + "\n"
-                
-                if not text_content.strip():
-                    raise HTTPException(status_code=400, detail="Could not extract any text from the PDF file. The file might be scanned or contain only images.")
-            except Exception as pdf_error:
-                print(f"PDF processing error: {str(pdf_error)}")  # Debug log
-                raise HTTPException(status_code=400, detail=f"Error processing PDF file: {str(pdf_error)}")
-        else:
-            # Process text files
-            try:
-                text_content = content.decode('utf-8')
-            except UnicodeDecodeError:
-                # Try a different encoding if utf-8 fails
-                text_content = content.decode('latin-1')
-
-        # Chunk the text into larger pieces to avoid creating too many small records
-        # Strategy: split into sentence-like pieces then accumulate into chunks of ~chunk_size_chars
-        chunk_size_chars = int(os.getenv("CHUNK_SIZE_CHARS", "800"))
-        max_chunks_per_file = int(os.getenv("MAX_CHUNKS_PER_FILE", "200"))
-
-        # Normalize newlines and split on sentence boundaries (simple heuristic)
-        normalized = re.sub(r"\s+", " ", text_content.replace('\n', ' ')).strip()
-        if not normalized:
-            raise HTTPException(status_code=400, detail="No readable content found in file")
-
-        # Very simple sentence splitter (keep punctuation)
-        sentences = re.split(r'(?<=[\.!?])\s+', normalized)
-
-        chunks: List[str] = []
-        current = []
-        current_len = 0
-        for s in sentences:
-            s = s.strip()
-            if not s:
-                continue
-            # If adding this sentence would exceed the target chunk size, flush current
-            if current_len + len(s) + 1 > chunk_size_chars and current:
-                chunks.append(' '.join(current).strip())
-                current = [s]
-                current_len = len(s)
-            else:
-                current.append(s)
-                current_len += len(s) + 1
-
-            # Cap number of chunks for a single file
-            if len(chunks) >= max_chunks_per_file:
-                break
-
-        if current and len(chunks) < max_chunks_per_file:
-            chunks.append(' '.join(current).strip())
-
-        if not chunks:
-            raise HTTPException(status_code=400, detail="No readable content found in file")
-
-        # Check collection count and enforce a conservative quota to avoid cloud tenant limits
-        try:
-            existing_count = collection.count()
-        except Exception:
-            # If count isn't available, fall back to 0 to avoid blocking
-            existing_count = 0
-
-        chroma_quota = int(os.getenv("CHROMA_MAX_RECORDS", "300"))
-        if existing_count + len(chunks) > chroma_quota:
-            raise HTTPException(status_code=400, detail=(
-                f"Quota exceeded: adding {len(chunks)} records would exceed the allowed number of records. "
-                f"Current usage: {existing_count}, quota limit: {chroma_quota}. "
-                "Reduce the number of chunks (increase CHUNK_SIZE_CHARS or set MAX_CHUNKS_PER_FILE), "
-                "or request a quota increase from your Chroma provider."))
-
-        # Add to Chroma
         try:
-            collection.add(
-                documents=chunks,
-                metadatas=[{"source": file.filename} for _ in chunks],
-                ids=[f"{file.filename}-{i}" for i in range(len(chunks))]
-            )
-        except Exception as add_err:
-            # Surface provider error (e.g., quota from cloud service)
-            raise HTTPException(status_code=500, detail=f"Error adding documents to vector DB: {str(add_err)}")
+            job = ingest_jobs.submit(file.filename, content)
+        except IngestError as busy:
+            raise HTTPException(status_code=429, detail=str(busy))
 
         return {
-            "message": f"Successfully processed {file.filename}",
-            "chunks": len(chunks)
+            "message": f"Accepted {file.filename} for processing",
+            "job_id": job.job_id,
+            "status": job.status
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.get("/api/upload/{job_id}")
+async def upload_status(job_id: str):
+    """Report progress of a background upload job (pages parsed, chunks stored)."""
+    if ingest_jobs is None:
+        raise HTTPException(status_code=503, detail="Search collection is not initialized yet")
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Upload job {job_id} not found")
+    return job.to_dict()
+
 @app.get("/api/documents/")
 async def list_documents():
     try:
@@ -492,7 +552,7 @@ async def list_documents():
             return {"document_count": 0, "message": "Collection not initialized"}
 
         # Get all documents in the collection
-        count = collection.count()
+        count = await run_blocking(collection.count)
         return {
             "document_count": count,
             "message": f"Found {count} document chunks in the collection"
@@ -503,135 +563,95 @@ async def list_documents():
 @app.get("/api/quiz/status/")
 async def quiz_status():
     """Return status of background quiz generation."""
-    global pre_generated_quiz, pre_generated_quiz_error, pre_generated_quiz_timestamp, pre_generated_quiz_task
-    in_progress = pre_generated_quiz_task is not None and not pre_generated_quiz_task.done()
+    merged = quiz_engine.merged() if quiz_engine is not None else None
     age = None
-    if pre_generated_quiz_timestamp:
-        age = int(time.time() - pre_generated_quiz_timestamp)
-    
+    if merged:
+        age = int(time.time() - merged["generated_at"])
+
     status = {
-        "ready": pre_generated_quiz is not None,
-        "in_progress": in_progress,
-        "error": pre_generated_quiz_error or "",
+        "ready": merged is not None,
+        "in_progress": quiz_engine is not None and quiz_engine.in_progress(),
+        "error": (quiz_engine.last_error if quiz_engine is not None else None) or "",
         "age_seconds": age,
-        "cache_max_age": QUIZ_CACHE_MAX_AGE
+        "corpus_version": quiz_engine.corpus_version if quiz_engine is not None else None
     }
     print(f"[quiz-status] ready={status['ready']}, in_progress={status['in_progress']}, error={status['error'][:50] if status['error'] else 'none'}")
     return status
 
 @app.get("/api/quiz/preloaded/")
 async def get_preloaded_quiz():
-    """Return pre-generated quiz if available and fresh."""
-    global pre_generated_quiz, pre_generated_quiz_timestamp
-    if pre_generated_quiz and pre_generated_quiz_timestamp:
-        if (time.time() - pre_generated_quiz_timestamp) <= QUIZ_CACHE_MAX_AGE:
-            return {"source": "cache", **pre_generated_quiz}
+    """Return the merged per-source quizzes from memory (no model call)."""
+    merged = quiz_engine.merged() if quiz_engine is not None else None
+    if merged:
+        return {"source": "cache", **merged}
     return {"detail": "Quiz not ready"}
 
 @app.post("/api/quiz/regenerate/")
 async def regenerate_quiz():
-    """Trigger async regeneration of quiz cache."""
-    global pre_generated_quiz_task
-    if pre_generated_quiz_task and not pre_generated_quiz_task.done():
+    """Trigger async regeneration of every source's quiz."""
+    if quiz_engine is None:
+        raise HTTPException(status_code=503, detail="Search collection is not initialized yet")
+    if not quiz_engine.start_refresh(force=True):
         return {"message": "Quiz generation already in progress"}
-    pre_generated_quiz_task = asyncio.create_task(_background_generate_quiz(initial=False))
     return {"message": "Quiz regeneration started"}
 
 @app.post("/api/quiz/generate/")
 async def generate_quiz():
-    """Generate a 20-question quiz from all documents in the database.
+    """Return a quiz covering every document in the database.
 
-    To keep the request reliable for the upstream model, we aggressively cap
-    the amount of context sent: a maximum number of docs and a global character
-    limit. Both can be tuned via environment variables.
+    Quizzes are cached per source under a hash of the source's chunk IDs, so only
+    sources whose content changed since their quiz was generated cost a model call;
+    the rest are merged from memory. The context sent to the model is capped (see
+    quiz_engine.collect_quiz_context), and concurrent requests for the same source
+    version share one in-flight generation.
     """
     try:
-        # Serve from cache if fresh
-        global pre_generated_quiz, pre_generated_quiz_timestamp
-        if pre_generated_quiz and pre_generated_quiz_timestamp and (time.time() - pre_generated_quiz_timestamp) <= QUIZ_CACHE_MAX_AGE:
-            return {"source": "cache", **pre_generated_quiz}
-        if collection is None:
+        if collection is None or quiz_engine is None:
             raise HTTPException(status_code=503, detail="Search collection is not initialized yet")
 
-        # Get all documents from the collection
-        count = collection.count()
-        if count == 0:
-            raise HTTPException(status_code=400, detail="No documents available. Please upload study materials first.")
-
-        # Limits (tunable via env)
-        max_docs = int(os.getenv("QUIZ_MAX_DOCS", "60"))
-        per_doc_char_limit = int(os.getenv("QUIZ_PER_DOC_CHAR_LIMIT", "600"))
-        total_char_budget = int(os.getenv("QUIZ_TOTAL_CHAR_BUDGET", "16000"))
-
-        # Retrieve a subset of documents
-        print(f"[quiz] total collection count={count}; retrieving up to {min(count, max_docs)} docs")
         try:
-            results = collection.get(
-                limit=min(count, max_docs),
-                include=["documents"]
-            )
-        except Exception as get_err:
-            print(f"[quiz] collection.get failed: {get_err}")
-            raise HTTPException(status_code=500, detail=f"Vector retrieval failed: {get_err}")
-
-        if not results or not results.get("documents"):
-            raise HTTPException(status_code=400, detail="Could not retrieve documents from database")
-
-        docs_raw = results["documents"]
-
-        # Some providers may return nested lists; flatten defensively
-        flat_docs: List[str] = []
-        for d in docs_raw:
-            if isinstance(d, list):
-                flat_docs.extend([str(x) for x in d if x])
-            elif d:
-                flat_docs.append(str(d))
-
-        if not flat_docs:
-            raise HTTPException(status_code=400, detail="No document text retrieved from database")
-
-        # Trim each doc and enforce a global budget
-        trimmed: List[str] = []
-        budget_left = total_char_budget
-        for doc in flat_docs:
-            if budget_left <= 0:
-                break
-            snippet = doc[:per_doc_char_limit]
-            # Ensure we don't exceed total budget
-            if len(snippet) > budget_left:
-                snippet = snippet[:max(0, budget_left)]
-            if snippet:
-                trimmed.append(snippet)
-                budget_left -= len(snippet)
-
-        if not trimmed:
-            raise HTTPException(status_code=400, detail="Content budget exhausted while preparing quiz context")
-
-        # Quiz prompt (concise to save tokens)
-        quiz_prompt = (
-            "Create a 20-question study quiz from the provided course materials. "
-            "Diversify types (concept recall, short answer, application). "
-            "Return STRICT JSON with: {\"questions\":[{\"question\":string,\"answer\":string}...]}. "
-            "Keep questions self-contained and answers concise with a 1–2 sentence explanation."
-        )
-
-        # Use the model to generate the quiz
-        from BackEnd.model_service import get_ai_response
-        print(f"[quiz] sending {len(trimmed)} docs; total_chars={sum(len(t) for t in trimmed)} budget_left={budget_left}")
-        try:
-            response = get_ai_response(quiz_prompt, trimmed)
-            print(f"[quiz] model response length={len(response)}")
-        except Exception as model_err:
-            print(f"[quiz] model error: {model_err}")
-            raise HTTPException(status_code=500, detail=f"Model error: {model_err}")
-
-        return {"quiz": response, "used_docs": len(trimmed)}
+            return await quiz_engine.refresh()
+        except QuizError as quiz_err:
+            raise HTTPException(status_code=quiz_err.status_code, detail=quiz_err.detail)
     except HTTPException:
         raise
     except Exception as e:
         # Provide a clearer error message while keeping details for logs
         raise HTTPException(status_code=500, detail=f"Quiz generation failed: {str(e)}")
 
+@app.post("/api/quiz/generate/stream")
+async def generate_quiz_stream():
+    """Stream quiz questions as Server-Sent Events, each as soon as it is ready.
+
+    Cached sources are sent immediately and new questions as the model finishes each
+    one, so a student can start after the first question. Each data event carries
+    {"index", "source", "question", "answer"}; the stream ends with a "done" event
+    ({"count", "corpus_version"}) or an "error" event ({"status_code", "detail"}).
+    """
+    if collection is None or quiz_engine is None:
+        raise HTTPException(status_code=503, detail="Search collection is not initialized yet")
+
+    async def event_stream():
+        count = 0
+        try:
+            async for item in quiz_engine.stream():
+                yield _sse_event({"index": count, **item})
+                count += 1
+        except QuizError as quiz_err:
+            yield _sse_event({"status_code": quiz_err.status_code, "detail": quiz_err.detail}, event="error")
+            return
+        except Exception as e:
+            print(f"[quiz-stream] failed: {e}")
+            yield _sse_event({"status_code": 500, "detail": f"Quiz generation failed: {str(e)}"}, event="error")
+            return
+        yield _sse_event({"count": count, "corpus_version": quiz_engine.corpus_version}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/diagnostics/chroma")
 async def chroma_diagnostics():
     """Return diagnostic information about the Chroma collection for debugging."""
@@ -641,12 +661,12 @@ async def chroma_diagnostics():
     if collection is None:
         return info
     try:
-        count = collection.count()
+        count = await run_blocking(collection.count)
         info["count"] = count
         sample_limit = min(count, 5)
         if sample_limit > 0:
             try:
-                sample = collection.get(limit=sample_limit, include=["documents", "metadatas", "ids"])
+                sample = await run_blocking(collection.get, limit=sample_limit, include=["documents", "metadatas", "ids"])
                 docs = sample.get("documents") or []
                 flat = []
                 for d in docs:
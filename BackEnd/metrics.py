@@ -0,0 +1,242 @@
+"""
+Metrics for TutorApp
+Low-overhead latency and token histograms per request stage, exposed in Prometheus text format.
+"""
+
+import time
+import bisect
+import functools
+import inspect
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds (seconds) of the latency buckets; the +Inf bucket is implicit
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Upper bounds of the per-call token count buckets
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+# Quantiles estimated from the buckets for every histogram
+QUANTILES = (0.5, 0.95, 0.99)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram: observe() is one bisect and two additions.
+
+    Quantiles are estimated like Prometheus' histogram_quantile(): find the bucket holding
+    the target rank and interpolate linearly within it.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        # counts[i] = observations in (buckets[i-1], buckets[i]]; the last slot is +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, in_bucket in enumerate(self.counts):
+            if in_bucket and cumulative + in_bucket >= rank:
+                if i == len(self.buckets):
+                    # Beyond the largest bound: report the bound, as Prometheus does
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - cumulative) / in_bucket
+            cumulative += in_bucket
+        return self.buckets[-1]
+
+
+class _Family:
+    def __init__(self, name: str, help_text: str, kind: str, buckets: Optional[Sequence[float]] = None):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.buckets = buckets
+        # labels -> Histogram (histograms) or float (counters)
+        self.series: Dict[Labels, object] = {}
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """
+    Named histogram and counter families keyed by label set.
+
+    One lock guards every update; each update is a dict lookup plus a few additions, so
+    recording is cheap enough to wrap every request stage.
+    """
+
+    def __init__(self):
+        self._families: Dict[str, _Family] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        """Declare a histogram family (no-op if it already exists)."""
+        with self._lock:
+            self._families.setdefault(name, _Family(name, help_text, "histogram", buckets))
+
+    def counter(self, name: str, help_text: str) -> None:
+        """Declare a counter family (no-op if it already exists)."""
+        with self._lock:
+            self._families.setdefault(name, _Family(name, help_text, "counter"))
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Record one observation in a declared histogram."""
+        key = _labels(labels)
+        with self._lock:
+            family = self._families[name]
+            histogram = family.series.get(key)
+            if histogram is None:
+                histogram = family.series[key] = Histogram(family.buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        """Increment a declared counter."""
+        key = _labels(labels)
+        with self._lock:
+            family = self._families[name]
+            family.series[key] = family.series.get(key, 0) + amount
+
+    def render(self) -> str:
+        """Return every family in the Prometheus text exposition format (0.0.4).
+
+        Each histogram also gets a `<name>_quantile` gauge family with the p50/p95/p99
+        estimates, so percentiles are readable without a Prometheus server.
+        """
+        lines: List[str] = []
+        with self._lock:
+            for family in self._families.values():
+                lines.append(f"# HELP {family.name} {family.help}")
+                lines.append(f"# TYPE {family.name} {family.kind}")
+                if family.kind == "counter":
+                    for labels, value in sorted(family.series.items()):
+                        lines.append(f"{family.name}{_format_labels(labels)} {_format_number(value)}")
+                    continue
+
+                quantile_lines: List[str] = []
+                for labels, histogram in sorted(family.series.items()):
+                    cumulative = 0
+                    for bound, in_bucket in zip(histogram.buckets, histogram.counts):
+                        cumulative += in_bucket
+                        lines.append(f"{family.name}_bucket{_format_labels(labels, (('le', _format_number(bound)),))} {cumulative}")
+                    lines.append(f"{family.name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{family.name}_sum{_format_labels(labels)} {_format_number(histogram.sum)}")
+                    lines.append(f"{family.name}_count{_format_labels(labels)} {histogram.count}")
+                    for q in QUANTILES:
+                        quantile_lines.append(
+                            f"{family.name}_quantile{_format_labels(labels, (('quantile', str(q)),))} "
+                            f"{_format_number(histogram.quantile(q))}"
+                        )
+                lines.append(f"# HELP {family.name}_quantile {family.help} (estimated quantiles)")
+                lines.append(f"# TYPE {family.name}_quantile gauge")
+                lines.extend(quantile_lines)
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+metrics.histogram("tutorapp_http_request_seconds", "Time to serve an HTTP request, including streamed bodies.")
+metrics.counter("tutorapp_http_requests_total", "HTTP requests served, by status code.")
+metrics.histogram("tutorapp_stage_seconds", "Time spent in each request stage.")
+metrics.histogram("tutorapp_model_tokens", "Prompt and completion tokens per model call.", TOKEN_BUCKETS)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Record a stage duration measured by the caller."""
+    metrics.observe("tutorapp_stage_seconds", seconds, stage=stage)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the enclosed block (sync or async code) into tutorapp_stage_seconds{stage=...}."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def timed(stage: str):
+    """Decorator form of span() for plain and async functions."""
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe_tokens(kind: str, count: int) -> None:
+    """Record the prompt or completion token count of one model call."""
+    metrics.observe("tutorapp_model_tokens", count, kind=kind)
+
+
+class RequestTimingMiddleware:
+    """
+    ASGI middleware recording each request's duration per route template.
+
+    Timing ends when the last body chunk is sent, so streamed (SSE) responses are
+    measured in full. Routes are labelled by template ("/api/chat/thread/{thread_id}"),
+    never by raw path, to keep the number of series bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope.get("method", "")
+            metrics.observe("tutorapp_http_request_seconds", time.perf_counter() - started,
+                            method=method, route=route)
+            metrics.inc("tutorapp_http_requests_total", method=method, route=route, status=str(status[0]))
@@ -1,10 +1,12 @@
 import sys
 import os
 from pathlib import Path
-from typing import List
+from typing import List, AsyncIterator, Optional
 import importlib.util
 import traceback
 
+from .metrics import observe_stage, observe_tokens
+
 # Ensure project root is on sys.path (useful for relative imports in some setups)
 project_root = str(Path(__file__).parents[1])
 if project_root not in sys.path:
@@ -37,6 +39,39 @@ if not hasattr(ModelCall, 'get_model_response'):
     raise AttributeError(f"Module {model_call_path} does not define get_model_response(prompt, chunks)")
 
 get_model_response = ModelCall.get_model_response
+get_model_response_async = ModelCall.get_model_response_async
+stream_model_response_async = ModelCall.stream_model_response_async
+summarize_conversation_async = ModelCall.summarize_conversation_async
+aclose = ModelCall.aclose
+
+# modelCall doesn't depend on the backend; its latencies and token counts are recorded here
+ModelCall.set_metrics_hooks(observe_stage, observe_tokens)
+
+
+RATE_LIMIT_MESSAGE = "⏱️ The AI service is currently experiencing high demand. Please wait 10-20 seconds and try your question again."
+GENERIC_ERROR_MESSAGE = "I apologize, but I encountered an error while processing your request. Please try again."
+DEBUG_ERROR_PREFIX = "Error while processing request: "
+
+
+def _error_message(e: Exception) -> str:
+    """Turn a model exception into the user-facing message returned by get_ai_response."""
+    # Check if it's a rate limit error
+    error_str = str(e)
+    if "rate_limit" in error_str.lower() or "429" in error_str:
+        return RATE_LIMIT_MESSAGE
+
+    # Return a more helpful message when DEBUG=true
+    debug = os.getenv('DEBUG', 'false').lower() in ('1', 'true', 'yes')
+    if debug:
+        tb = traceback.format_exc()
+        return f"{DEBUG_ERROR_PREFIX}{str(e)}\n\nTraceback:\n{tb}"
+
+    return GENERIC_ERROR_MESSAGE
+
+
+def is_error_response(text: str) -> bool:
+    """True if `text` is one of the fallback messages returned when the model call failed."""
+    return text in (RATE_LIMIT_MESSAGE, GENERIC_ERROR_MESSAGE) or text.startswith(DEBUG_ERROR_PREFIX)
 
 
 def get_ai_response(prompt: str, chunks: List[str], conversation_history: str = None) -> str:
@@ -59,15 +94,52 @@ def get_ai_response(prompt: str, chunks: List[str], conversation_history: str =
         print("Error getting model response:")
         traceback.print_exc()
 
-        # Check if it's a rate limit error
-        error_str = str(e)
-        if "rate_limit" in error_str.lower() or "429" in error_str:
-            return "⏱️ The AI service is currently experiencing high demand. Please wait 10-20 seconds and try your question again."
+        return _error_message(e)
 
-        # Return a more helpful message when DEBUG=true
-        debug = os.getenv('DEBUG', 'false').lower() in ('1', 'true', 'yes')
-        if debug:
-            tb = traceback.format_exc()
-            return f"Error while processing request: {str(e)}\n\nTraceback:\n{tb}"
 
-        return "I apologize, but I encountered an error while processing your request. Please try again."
\ No newline at end of file
+async def get_ai_response_async(prompt: str, chunks: List[str], conversation_history: str = None) -> str:
+    """Awaitable variant of get_ai_response backed by the pooled async model client.
+
+    Same arguments and error handling as get_ai_response, but no thread is held
+    while the completion (or a retry backoff) is pending.
+    """
+    try:
+        return await get_model_response_async(prompt, chunks, conversation_history=conversation_history)
+    except Exception as e:
+        print("Error getting model response:")
+        traceback.print_exc()
+        return _error_message(e)
+
+
+class ModelStreamError(Exception):
+    """Raised by stream_ai_response when the model stream fails; str() is the user-facing message."""
+
+
+async def stream_ai_response(prompt: str, chunks: List[str], conversation_history: str = None) -> AsyncIterator[str]:
+    """Stream the AI response token by token.
+
+    Errors are logged and raised as ModelStreamError carrying the user-facing message
+    (same text as get_ai_response), so callers can report the failure separately
+    instead of mixing it into the tokens already sent.
+    """
+    try:
+        async for token in stream_model_response_async(prompt, chunks, conversation_history=conversation_history):
+            yield token
+    except Exception as e:
+        print("Error streaming model response:")
+        traceback.print_exc()
+        raise ModelStreamError(_error_message(e)) from e
+
+
+async def summarize_conversation(previous_summary: str, transcript: str) -> Optional[str]:
+    """Merge older messages into a thread's rolling summary.
+
+    Returns None if the model call fails, so a failed attempt never overwrites a
+    good summary with an error message; the next reply simply tries again.
+    """
+    try:
+        summary = await summarize_conversation_async(previous_summary, transcript)
+        return summary.strip() if summary and summary.strip() else None
+    except Exception as e:
+        print(f"[summary] model error: {type(e).__name__}: {e}")
+        return None
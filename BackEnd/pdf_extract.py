@@ -0,0 +1,81 @@
+"""
+PDF text extraction for TutorApp
+Splits a PDF into page ranges, extracts them in parallel worker processes and streams page text in order.
+"""
+
+import io
+import os
+import asyncio
+import tempfile
+from concurrent.futures import Executor
+from typing import AsyncIterator, List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+
+from .executor import run_blocking
+
+# Pages handed to one worker process at a time
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+
+def count_pdf_pages(content: bytes) -> int:
+    """Return the number of pages in a PDF (only reads the page tree, no text extraction)."""
+    return len(PdfReader(io.BytesIO(content)).pages)
+
+
+# Per worker process: the PDF last parsed, as (path, reader), reused by every range of that file
+_worker_reader: Optional[Tuple[str, PdfReader]] = None
+
+
+def _reader_for(path: str) -> PdfReader:
+    global _worker_reader
+    if _worker_reader is None or _worker_reader[0] != path:
+        _worker_reader = (path, PdfReader(path))
+    return _worker_reader[1]
+
+
+def extract_page_range(path: str, start: int, end: int) -> List[str]:
+    """
+    Extract text from pages [start, end) of the PDF at `path` (runs in a worker process).
+
+    Only the path crosses the process boundary, and each worker parses a file once
+    however many of its ranges it is given.
+    """
+    pdf_reader = _reader_for(path)
+    return [pdf_reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _write_temp_pdf(content: bytes) -> str:
+    with tempfile.NamedTemporaryFile(prefix="tutorapp-", suffix=".pdf", delete=False) as handle:
+        handle.write(content)
+        return handle.name
+
+
+async def iter_pdf_pages(content: bytes, executor: Executor, page_count: int) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) for every page, in order, as soon as each range is extracted.
+
+    All page ranges are submitted to `executor` up front so they parse in parallel; the
+    caller can start consuming the first pages while later ranges are still running.
+    The bytes are written once to a temporary file that the workers read by path, rather
+    than pickling the whole PDF into every task.
+    """
+    loop = asyncio.get_running_loop()
+    path = await run_blocking(_write_temp_pdf, content)
+    ranges = [(start, min(start + PDF_PAGES_PER_TASK, page_count))
+              for start in range(0, page_count, PDF_PAGES_PER_TASK)]
+    futures = [loop.run_in_executor(executor, extract_page_range, path, start, end)
+               for start, end in ranges]
+    try:
+        for (start, _), future in zip(ranges, futures):
+            for offset, text in enumerate(await future):
+                yield start + offset, text
+    finally:
+        # Stop queued ranges if the consumer gives up early (e.g. the job failed)
+        for future in futures:
+            future.cancel()
+        # Ranges already running hold the parsed file in memory, so the file can go now
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,661 @@
+"""
+Quiz Engine for TutorApp
+Generates and caches quizzes per source document, keyed on the source's chunk IDs, and merges them on demand.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import asyncio
+from collections import Counter
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+from .executor import run_blocking
+from .metrics import span
+
+# Seconds to wait after an upload before regenerating, so a burst of uploads is handled once
+QUIZ_REGEN_DEBOUNCE = float(os.getenv("QUIZ_REGEN_DEBOUNCE", "5"))
+# Questions in the merged quiz served to students (taken round-robin across sources)
+QUIZ_MAX_QUESTIONS = int(os.getenv("QUIZ_MAX_QUESTIONS", "20"))
+# Source quizzes generated concurrently (each is one model call)
+QUIZ_GENERATION_CONCURRENCY = int(os.getenv("QUIZ_GENERATION_CONCURRENCY", "4"))
+# Questions asked of each source beyond its share of QUIZ_MAX_QUESTIONS (covers duplicates dropped in the merge)
+QUIZ_EXTRA_QUESTIONS = int(os.getenv("QUIZ_EXTRA_QUESTIONS", "2"))
+# Records read per page when building the corpus manifest
+MANIFEST_PAGE_SIZE = int(os.getenv("QUIZ_MANIFEST_PAGE_SIZE", "1000"))
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+QUIZ_PROMPT = (
+    "Create a {count}-question study quiz from the provided course materials. "
+    "Diversify types (concept recall, short answer, application). "
+    "Return STRICT JSON with: {{\"questions\":[{{\"question\":string,\"answer\":string}}...]}}. "
+    "Keep questions self-contained and answers concise with a 1–2 sentence explanation."
+)
+
+
+class QuizQuestion(BaseModel):
+    """One quiz item; every question returned to clients is validated against this."""
+    # Models often write numeric answers ("answer": 42) without quotes
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    question: str = Field(min_length=1)
+    answer: str
+
+
+class QuizError(Exception):
+    """Raised when a quiz cannot be generated; carries the HTTP status to report."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def corpus_manifest(collection) -> Dict[str, List[str]]:
+    """
+    Return {source: chunk IDs in document order} for every source in the collection (blocking).
+
+    Only IDs and metadata are read, page by page. Chunk IDs are content-addressed, so a
+    source's ID set changes exactly when its content does; the order comes from each
+    record's chunk_index (records stored before it was kept sort last, by ID).
+    """
+    manifest: Dict[str, List[str]] = {}
+    positions: Dict[str, float] = {}
+    offset = 0
+    while True:
+        page = collection.get(limit=MANIFEST_PAGE_SIZE, offset=offset, include=["metadatas"])
+        ids = page.get('ids') or []
+        for chunk_id, metadata in zip(ids, page.get('metadatas') or []):
+            source = (metadata or {}).get('source')
+            if source:
+                manifest.setdefault(source, []).append(chunk_id)
+                positions[chunk_id] = metadata.get('chunk_index', float("inf"))
+        offset += len(ids)
+        if len(ids) < MANIFEST_PAGE_SIZE:
+            break
+    for ids in manifest.values():
+        ids.sort(key=lambda chunk_id: (positions[chunk_id], chunk_id))
+    return manifest
+
+
+def version_of(chunk_ids: Iterable[str]) -> str:
+    """Short hash of a set of chunk IDs (a source's, or the whole corpus's, version); order doesn't matter."""
+    return hashlib.sha256("\n".join(sorted(chunk_ids)).encode("utf-8")).hexdigest()[:16]
+
+
+def validate_question(raw) -> Optional[Dict]:
+    """Return `raw` as a QuizQuestion dict, or None if it doesn't match the schema."""
+    try:
+        return QuizQuestion.model_validate(raw).model_dump()
+    except ValidationError:
+        return None
+
+
+def parse_quiz_questions(text: str) -> List[Dict]:
+    """
+    Extract the questions list from a model reply ({"questions": [...]}, possibly wrapped in prose).
+
+    Decodes a JSON value at each "{" in turn, so braces in the surrounding prose don't
+    hide the questions object.
+    """
+    text = text or ""
+    decoder = json.JSONDecoder()
+    start = text.find("{")
+    while start != -1:
+        try:
+            parsed, _ = decoder.raw_decode(text, start)
+        except ValueError:
+            parsed = None
+        questions = parsed.get("questions") if isinstance(parsed, dict) else None
+        if isinstance(questions, list):
+            return [q for q in map(validate_question, questions) if q]
+        start = text.find("{", start + 1)
+    return []
+
+
+class QuestionStreamParser:
+    """
+    Incrementally extracts question objects from a model reply as it streams in.
+
+    Tracks JSON object nesting (ignoring braces inside strings) and, whenever an object
+    closes, tries to validate it as a QuizQuestion, so each {"question", "answer"} item
+    is available as soon as its closing brace arrives. The enclosing {"questions": [...]}
+    wrapper and any surrounding prose don't validate and are skipped.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        # Offsets (into _text) of objects opened but not yet closed
+        self._open: List[int] = []
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Consume the next piece of the reply; returns the questions it completed."""
+        self._text += chunk
+        found: List[Dict] = []
+        while self._pos < len(self._text):
+            ch = self._text[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"' and self._open:
+                self._in_string = True
+            elif ch == "{":
+                self._open.append(self._pos)
+            elif ch == "}" and self._open:
+                start = self._open.pop()
+                try:
+                    question = validate_question(json.loads(self._text[start:self._pos + 1]))
+                except ValueError:
+                    question = None
+                if question:
+                    found.append(question)
+            self._pos += 1
+
+        # Text before the outermost open object can't be part of a question any more
+        keep_from = self._open[0] if self._open else self._pos
+        if keep_from:
+            self._text = self._text[keep_from:]
+            self._pos -= keep_from
+            self._open = [offset - keep_from for offset in self._open]
+        return found
+
+
+def _question_key(question: Dict) -> str:
+    return _NON_WORD.sub(" ", str(question.get("question", "")).lower()).strip()
+
+
+def questions_per_source(source_count: int) -> int:
+    """Questions to ask of each source so the merged quiz still fills QUIZ_MAX_QUESTIONS."""
+    share = -(-QUIZ_MAX_QUESTIONS // max(1, source_count))
+    return min(QUIZ_MAX_QUESTIONS, share + QUIZ_EXTRA_QUESTIONS)
+
+
+def sample_evenly(items: List[str], limit: int) -> List[str]:
+    """Pick up to `limit` items spread evenly across `items` (keeping their order) rather than the first `limit`."""
+    if len(items) <= limit:
+        return list(items)
+    return [items[i * len(items) // limit] for i in range(limit)]
+
+
+def collect_quiz_context(collection, source: str, chunk_ids: Optional[List[str]] = None,
+                         questions: int = QUIZ_MAX_QUESTIONS) -> List[str]:
+    """
+    Retrieve and trim the chunks of one source a quiz is generated from (blocking; run it via run_blocking).
+
+    To keep the request reliable for the upstream model, the amount of context is capped
+    aggressively: a maximum number of docs, a per-doc limit and a global character budget
+    (QUIZ_MAX_DOCS, QUIZ_PER_DOC_CHAR_LIMIT, QUIZ_TOTAL_CHAR_BUDGET). The budget is for a
+    full QUIZ_MAX_QUESTIONS quiz and is scaled down to the `questions` asked of this source.
+    When the source's `chunk_ids` are known (in document order), only as many docs as fit
+    the budget are sampled evenly across all of them and sent in document order, instead
+    of taking the first QUIZ_MAX_DOCS the store returns.
+
+    Raises:
+        QuizError: If the source has no retrievable text
+    """
+    # Limits (tunable via env)
+    max_docs = int(os.getenv("QUIZ_MAX_DOCS", "60"))
+    per_doc_char_limit = int(os.getenv("QUIZ_PER_DOC_CHAR_LIMIT", "600"))
+    total_char_budget = int(os.getenv("QUIZ_TOTAL_CHAR_BUDGET", "16000"))
+    total_char_budget = max(per_doc_char_limit, total_char_budget * questions // max(1, QUIZ_MAX_QUESTIONS))
+
+    # Retrieve a subset of the source's documents
+    try:
+        if chunk_ids:
+            # Docs beyond the budget would be cut anyway; fewer docs keep the sample spread over the whole source
+            max_docs = max(1, min(max_docs, total_char_budget // max(1, per_doc_char_limit)))
+            sample = sample_evenly(chunk_ids, max_docs)
+            print(f"[quiz] {source}: retrieving {len(sample)} of {len(chunk_ids)} docs")
+            results = collection.get(ids=sample, include=["documents"])
+            # get() by ID doesn't promise to keep the requested order
+            order = {chunk_id: i for i, chunk_id in enumerate(sample)}
+            ranked = sorted(zip(results.get("ids") or [], results.get("documents") or []),
+                            key=lambda pair: order.get(pair[0], len(order)))
+            results = {"documents": [doc for _, doc in ranked]}
+        else:
+            print(f"[quiz] {source}: retrieving up to {max_docs} docs")
+            results = collection.get(where={"source": source}, limit=max_docs, include=["documents"])
+    except Exception as get_err:
+        print(f"[quiz] collection.get failed: {get_err}")
+        raise QuizError(500, f"Vector retrieval failed: {get_err}")
+
+    if not results or not results.get("documents"):
+        raise QuizError(400, f"Could not retrieve documents for {source} from database")
+
+    # Some providers may return nested lists; flatten defensively
+    flat_docs: List[str] = []
+    for d in results["documents"]:
+        if isinstance(d, list):
+            flat_docs.extend([str(x) for x in d if x])
+        elif d:
+            flat_docs.append(str(d))
+
+    if not flat_docs:
+        raise QuizError(400, f"No document text retrieved for {source}")
+
+    # Trim each doc and enforce a global budget
+    trimmed: List[str] = []
+    budget_left = total_char_budget
+    for doc in flat_docs:
+        if budget_left <= 0:
+            break
+        snippet = doc[:per_doc_char_limit]
+        # Ensure we don't exceed total budget
+        if len(snippet) > budget_left:
+            snippet = snippet[:max(0, budget_left)]
+        if snippet:
+            trimmed.append(snippet)
+            budget_left -= len(snippet)
+
+    if not trimmed:
+        raise QuizError(400, "Content budget exhausted while preparing quiz context")
+
+    print(f"[quiz] {source}: sending {len(trimmed)} docs; total_chars={sum(len(t) for t in trimmed)} budget_left={budget_left}")
+    return trimmed
+
+
+class QuizEngine:
+    """
+    Per-source quiz generation and cache, shared by the background and on-demand paths.
+
+    Each source document gets its own question set, sized to its share of
+    QUIZ_MAX_QUESTIONS (questions_per_source) and cached under the source's version
+    (a hash of its chunk IDs). refresh() regenerates only sources whose version changed
+    or whose cached set was asked for fewer questions than the current share, up to QUIZ_GENERATION_CONCURRENCY at a time; merged() combines the cached sets and
+    drops duplicate questions without calling the model. Generations are
+    single-flight per (source, version): concurrent callers await the same task rather
+    than starting another model call. Uploads call schedule_refresh(), which waits
+    QUIZ_REGEN_DEBOUNCE seconds so a burst of uploads triggers one regeneration.
+
+    With a ResultStore, generated quizzes are written to disk and load() restores those
+    matching the current source versions, so a restarted process with an unchanged
+    corpus serves quizzes without calling the model.
+    """
+
+    def __init__(self, collection, store=None):
+        self.collection = collection
+        self.store = store
+        # Source set the store was last pruned to
+        self._pruned_sources: Optional[frozenset] = None
+        # Set once the manifest has been scanned; afterwards update_source() keeps _versions current
+        self._scanned = False
+        # source -> {"version", "questions", "requested", "used_docs", "generated_at"}
+        self._quizzes: Dict[str, Dict] = {}
+        # Last manifest seen: source -> version
+        self._versions: Dict[str, str] = {}
+        self.corpus_version: Optional[str] = None
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        # Per in-flight generation: questions parsed so far, and stream() queues listening for more
+        self._partial: Dict[tuple, List[Dict]] = {}
+        self._listeners: Dict[tuple, List[asyncio.Queue]] = {}
+        # Last manifest seen: source -> chunk IDs (used to sample quiz context)
+        self._chunk_ids: Dict[str, List[str]] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending_sources: Set[str] = set()
+        self._debounce_task: Optional[asyncio.Task] = None
+        # True while _debounce_task is still waiting out the delay (and may be restarted)
+        self._debounce_sleeping = False
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.last_error: Optional[str] = None
+        self.generations = 0
+        self.coalesced = 0
+
+    def in_progress(self) -> bool:
+        pending = self._debounce_task is not None and not self._debounce_task.done()
+        refreshing = self._refresh_task is not None and not self._refresh_task.done()
+        return pending or refreshing or any(not task.done() for task in self._inflight.values())
+
+    async def load(self, rescan: bool = False) -> None:
+        """
+        Bring source versions up to date, drop quizzes for removed sources and restore stored quizzes.
+
+        The corpus manifest is scanned only the first time (or with `rescan`); after that
+        uploads report their new chunk IDs through update_source(), so requests don't pay for
+        a scan that grows with the corpus.
+        """
+        if rescan or not self._scanned:
+            with span("quiz.manifest"):
+                manifest = await run_blocking(corpus_manifest, self.collection)
+            self._chunk_ids = manifest
+            self._versions = {source: version_of(ids) for source, ids in manifest.items()}
+            self.corpus_version = version_of(chunk_id for ids in manifest.values() for chunk_id in ids)
+            self._scanned = True
+        # Quizzes for sources that no longer exist are dropped
+        for source in list(self._quizzes):
+            if source not in self._versions:
+                del self._quizzes[source]
+
+        if self.store is None:
+            return
+        missing = {source: version for source, version in self._versions.items()
+                   if self._quizzes.get(source, {}).get("version") != version}
+        try:
+            if missing:
+                restored = await run_blocking(self.store.load_quizzes, missing)
+                if restored:
+                    print(f"[quiz] restored stored quizzes for {', '.join(sorted(restored))}")
+                self._quizzes.update(restored)
+            sources = frozenset(self._versions)
+            if sources != self._pruned_sources:
+                await run_blocking(self.store.prune_quizzes, sources)
+                self._pruned_sources = sources
+        except Exception as e:
+            print(f"[quiz] result store read failed: {e}")
+
+    def update_source(self, source: str, chunk_ids: List[str]) -> None:
+        """Record a source's chunk IDs (in document order) after an upload, without re-reading the manifest."""
+        if chunk_ids:
+            self._chunk_ids[source] = list(chunk_ids)
+            self._versions[source] = version_of(chunk_ids)
+        else:
+            self._chunk_ids.pop(source, None)
+            self._versions.pop(source, None)
+        self.corpus_version = version_of(chunk_id for ids in self._chunk_ids.values() for chunk_id in ids)
+
+    def _is_current(self, source: str) -> bool:
+        """True if the cached quiz matches the source's version and asked for at least today's per-source share."""
+        entry = self._quizzes.get(source)
+        return (entry is not None and entry["version"] == self._versions.get(source)
+                and entry.get("requested", 0) >= questions_per_source(len(self._versions)))
+
+    def _start(self, source: str, version: str) -> asyncio.Task:
+        """Return the generation task for (source, version), starting one if none is in flight."""
+        key = (source, version)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            print(f"[quiz] joining in-flight generation for {source}")
+            return task
+
+        self._partial[key] = []
+        self._listeners[key] = []
+        task = asyncio.create_task(self._generate(source, version))
+        self._inflight[key] = task
+
+        def _finished(done: asyncio.Task) -> None:
+            if self._inflight.get(key) is done:
+                del self._inflight[key]
+                self._partial.pop(key, None)
+                self._listeners.pop(key, None)
+
+        task.add_done_callback(_finished)
+        return task
+
+    async def _generate_source(self, source: str, version: str) -> Dict:
+        # Shield so one caller disconnecting doesn't cancel the generation others are awaiting
+        return await asyncio.shield(self._start(source, version))
+
+    async def _generate(self, source: str, version: str) -> Dict:
+        from .model_service import stream_ai_response, ModelStreamError
+
+        key = (source, version)
+        self.generations += 1
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(QUIZ_GENERATION_CONCURRENCY)
+        # Each source only needs its share of the merged quiz, so the prompt and context shrink with the corpus size
+        count = questions_per_source(len(self._versions))
+        async with self._semaphore:
+            with span("quiz.context"):
+                trimmed = await run_blocking(collect_quiz_context, self.collection, source,
+                                             self._chunk_ids.get(source), count)
+            # The reply is parsed as it streams, so stream() listeners get each question
+            # as soon as the model closes it
+            parser = QuestionStreamParser()
+            parts: List[str] = []
+            questions: List[Dict] = []
+
+            def _emit(question: Dict) -> None:
+                questions.append(question)
+                self._partial[key].append(question)
+                for queue in self._listeners[key]:
+                    queue.put_nowait((source, question))
+
+            try:
+                async for token in stream_ai_response(QUIZ_PROMPT.format(count=count), trimmed):
+                    parts.append(token)
+                    for question in parser.feed(token):
+                        _emit(question)
+            except ModelStreamError as e:
+                raise QuizError(503, str(e))
+
+        response = "".join(parts)
+        print(f"[quiz] {source}: model response length={len(response)}")
+        if not questions:
+            # Listeners get questions recovered from the whole reply just like streamed ones
+            for question in parse_quiz_questions(response):
+                _emit(question)
+        if not questions:
+            raise QuizError(502, f"The model did not return quiz questions for {source}")
+
+        entry = {"version": version, "questions": questions, "requested": count,
+                 "used_docs": len(trimmed), "generated_at": time.time()}
+        # A newer version may have been stored while this one was generating
+        current = self._quizzes.get(source)
+        if self._versions.get(source) == version or current is None:
+            self._quizzes[source] = entry
+            if self.store is not None:
+                try:
+                    await run_blocking(self.store.save_quiz, source, entry)
+                except Exception as e:
+                    print(f"[quiz] result store write failed for {source}: {e}")
+        return entry
+
+    async def refresh(self, sources: Optional[Iterable[str]] = None, force: bool = False) -> Dict:
+        """
+        Bring cached quizzes up to date with the corpus and return the merged quiz.
+
+        Args:
+            sources: Only consider these sources (default: every source)
+            force: Rescan the corpus manifest and regenerate even if the cached version is current
+
+        Raises:
+            QuizError: If the corpus is empty, or every stale source failed to generate
+        """
+        await self.load(rescan=force)
+        if not self._versions:
+            raise QuizError(400, "No documents available. Please upload study materials first.")
+
+        wanted = set(sources) if sources is not None else set(self._versions)
+        stale = [source for source in sorted(wanted & set(self._versions))
+                 if force or not self._is_current(source)]
+
+        # Sources are generated concurrently; the semaphore in _generate caps model calls
+        results = await asyncio.gather(
+            *(self._generate_source(source, self._versions[source]) for source in stale),
+            return_exceptions=True
+        )
+        errors: List[QuizError] = []
+        for source, result in zip(stale, results):
+            if isinstance(result, QuizError):
+                print(f"[quiz] {source}: generation failed: {result.detail}")
+                errors.append(result)
+            elif isinstance(result, BaseException):
+                raise result
+
+        self.last_error = errors[-1].detail if errors else None
+        merged = self.merged()
+        if merged is None:
+            raise errors[-1] if errors else QuizError(503, "No quiz could be generated")
+        return merged
+
+    async def stream(self) -> AsyncIterator[Dict]:
+        """
+        Yield quiz questions as soon as each is available.
+
+        Sources with a current cached quiz are served immediately; stale sources are
+        generated (or joined, if already in flight) and their questions are yielded as the
+        model writes them. Each source contributes at most its share of QUIZ_MAX_QUESTIONS
+        until every source has finished; leftover questions then fill any remaining slots.
+        Generations continue (and are cached) even if the consumer stops early.
+
+        Yields:
+            {"source", "question", "answer"}, validated against QuizQuestion
+
+        Raises:
+            QuizError: If the corpus is empty, or no question could be produced
+        """
+        await self.load()
+        if not self._versions:
+            raise QuizError(400, "No documents available. Please upload study materials first.")
+
+        sources = sorted(self._versions)
+        share = max(1, -(-QUIZ_MAX_QUESTIONS // len(sources)))
+        # Items are (source, question); (source, None) marks a finished source
+        queue: asyncio.Queue = asyncio.Queue()
+        failures: Dict[str, QuizError] = {}
+        listening: List[tuple] = []
+
+        def _source_done(source: str, done: asyncio.Task) -> None:
+            error = None if done.cancelled() else done.exception()
+            if error is not None:
+                failures[source] = error if isinstance(error, QuizError) else QuizError(500, str(error))
+            queue.put_nowait((source, None))
+
+        for source in sources:
+            version = self._versions[source]
+            if self._is_current(source):
+                for question in self._quizzes[source]["questions"]:
+                    queue.put_nowait((source, question))
+                queue.put_nowait((source, None))
+                continue
+            task = self._start(source, version)
+            key = (source, version)
+            if key in self._listeners:
+                # Replay what an in-flight generation has already parsed, then listen for more
+                for question in self._partial[key]:
+                    queue.put_nowait((source, question))
+                self._listeners[key].append(queue)
+                listening.append(key)
+            task.add_done_callback(lambda done, source=source: _source_done(source, done))
+
+        seen: Set[str] = set()
+        per_source: Counter = Counter()
+        held: List[tuple] = []
+        emitted = 0
+        remaining = len(sources)
+        try:
+            while remaining and emitted < QUIZ_MAX_QUESTIONS:
+                source, question = await queue.get()
+                if question is None:
+                    remaining -= 1
+                    continue
+                if per_source[source] >= share:
+                    held.append((source, question))
+                    continue
+                key = _question_key(question)
+                if key in seen:
+                    continue
+                seen.add(key)
+                per_source[source] += 1
+                emitted += 1
+                yield {"source": source, **question}
+
+            for source, question in held:
+                if emitted >= QUIZ_MAX_QUESTIONS:
+                    break
+                key = _question_key(question)
+                if key in seen:
+                    continue
+                seen.add(key)
+                emitted += 1
+                yield {"source": source, **question}
+        finally:
+            for key in listening:
+                if queue in self._listeners.get(key, ()):
+                    self._listeners[key].remove(queue)
+
+        self.last_error = list(failures.values())[-1].detail if failures else None
+        if not emitted:
+            raise list(failures.values())[-1] if failures else QuizError(503, "No quiz could be generated")
+
+    def merged(self) -> Optional[Dict]:
+        """
+        Merge the cached per-source question sets (no model call, no database read).
+
+        Questions are taken round-robin across sources, up to QUIZ_MAX_QUESTIONS, so
+        every document is represented; a question whose normalized text was already
+        taken is skipped. Returns None if nothing is cached yet.
+        """
+        sources = [source for source in sorted(self._quizzes) if source in self._versions]
+        if not sources:
+            return None
+
+        questions: List[Dict] = []
+        seen: Set[str] = set()
+        queues = [list(self._quizzes[source]["questions"]) for source in sources]
+        while len(questions) < QUIZ_MAX_QUESTIONS and any(queues):
+            for queue in queues:
+                # Take this source's next question that isn't a duplicate
+                while queue and len(questions) < QUIZ_MAX_QUESTIONS:
+                    question = queue.pop(0)
+                    key = _question_key(question)
+                    if key not in seen:
+                        seen.add(key)
+                        questions.append(question)
+                        break
+
+        return {
+            "quiz": json.dumps({"questions": questions}),
+            "questions": questions,
+            "used_docs": sum(self._quizzes[source]["used_docs"] for source in sources),
+            "sources": [
+                {"source": source, "version": self._quizzes[source]["version"],
+                 "current": self._is_current(source),
+                 "questions": len(self._quizzes[source]["questions"])}
+                for source in sources
+            ],
+            "corpus_version": self.corpus_version,
+            "generated_at": max(self._quizzes[source]["generated_at"] for source in sources)
+        }
+
+    def start_refresh(self, force: bool = False) -> bool:
+        """Run refresh() in the background; returns False if one is already running."""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return False
+        self._refresh_task = asyncio.create_task(self._refresh_quietly(None, force))
+        return True
+
+    def schedule_refresh(self, sources: Iterable[str]) -> None:
+        """Regenerate quizzes for `sources` after QUIZ_REGEN_DEBOUNCE seconds without further uploads."""
+        self._pending_sources.update(sources)
+        # Only restart the delay; a task past it has drained its sources and must finish its refresh
+        if self._debounce_sleeping and self._debounce_task is not None and not self._debounce_task.done():
+            self._debounce_task.cancel()
+        self._debounce_sleeping = True
+        self._debounce_task = asyncio.create_task(self._debounced_refresh())
+
+    async def _debounced_refresh(self) -> None:
+        await asyncio.sleep(QUIZ_REGEN_DEBOUNCE)
+        self._debounce_sleeping = False
+        sources, self._pending_sources = self._pending_sources, set()
+        print(f"[quiz] regenerating after upload: {', '.join(sorted(sources))}")
+        await self._refresh_quietly(sources)
+
+    async def _refresh_quietly(self, sources: Optional[Iterable[str]], force: bool = False) -> None:
+        try:
+            await self.refresh(sources, force=force)
+        except Exception as e:
+            self.last_error = getattr(e, "detail", None) or str(e)
+            print(f"[quiz] background refresh failed: {self.last_error}")
+
+    def stats(self) -> Dict:
+        return {
+            "corpus_version": self.corpus_version,
+            "sources": len(self._versions),
+            "cached_sources": len(self._quizzes),
+            "in_progress": self.in_progress(),
+            "generations": self.generations,
+            "coalesced": self.coalesced
+        }
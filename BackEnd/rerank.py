@@ -0,0 +1,122 @@
+"""
+Reranking for TutorApp
+Diversifies retrieval candidates with maximal marginal relevance and fits them into a prompt token budget.
+"""
+
+import os
+import threading
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .tokens import count_tokens
+
+# Trade-off between relevance (1.0) and diversity (0.0) when picking the next chunk
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Candidates this similar to an already selected chunk are dropped as near-duplicates
+DUPLICATE_SIMILARITY = float(os.getenv("DUPLICATE_SIMILARITY", "0.95"))
+# Cross-encoder used to rescore candidates (requires sentence-transformers); unset to disable
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "")
+
+_reranker = None
+_reranker_failed = False
+_reranker_lock = threading.Lock()
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _scale(scores: np.ndarray) -> np.ndarray:
+    """Min-max scale scores to [0, 1] so relevance and similarity are comparable."""
+    low, high = float(scores.min()), float(scores.max())
+    if high - low < 1e-9:
+        return np.ones_like(scores)
+    return (scores - low) / (high - low)
+
+
+def mmr_select(embeddings: np.ndarray, relevance: np.ndarray, k: int,
+               lambda_: float = MMR_LAMBDA, duplicate_similarity: float = DUPLICATE_SIMILARITY) -> List[int]:
+    """
+    Order up to `k` candidates by maximal marginal relevance.
+
+    Args:
+        embeddings: (n, dim) candidate embeddings
+        relevance: (n,) relevance of each candidate to the query (any scale)
+        k: Maximum number of candidates to return
+        lambda_: Weight of relevance versus novelty
+        duplicate_similarity: Candidates at least this cosine-similar to a selected one are skipped
+
+    Returns:
+        Indices into the candidate list, in selection order
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+
+    vectors = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    similarity = vectors @ vectors.T
+    relevance = _scale(np.asarray(relevance, dtype=np.float32))
+
+    selected: List[int] = []
+    available = np.ones(n, dtype=bool)
+    # Highest similarity of each candidate to anything selected so far
+    redundancy = np.zeros(n, dtype=np.float32)
+    while len(selected) < k and available.any():
+        scores = lambda_ * relevance - (1 - lambda_) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+        available &= redundancy < duplicate_similarity
+    return selected
+
+
+def _get_reranker():
+    """Lazily load the cross-encoder named by RERANKER_MODEL, or None if unset/unavailable."""
+    global _reranker, _reranker_failed
+    if not RERANKER_MODEL or _reranker_failed:
+        return None
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None and not _reranker_failed:
+                try:
+                    from sentence_transformers import CrossEncoder
+                    _reranker = CrossEncoder(RERANKER_MODEL)
+                    print(f"[rerank] loaded cross-encoder {RERANKER_MODEL}")
+                except Exception as e:
+                    _reranker_failed = True
+                    print(f"[rerank] cross-encoder unavailable, using fused ranking only: {e}")
+    return _reranker
+
+
+def rerank_scores(query: str, documents: Sequence[str]) -> Optional[np.ndarray]:
+    """Score (query, document) pairs with the optional cross-encoder; None when it is disabled."""
+    reranker = _get_reranker()
+    if reranker is None or not documents:
+        return None
+    return np.asarray(reranker.predict([(query, doc) for doc in documents]), dtype=np.float32)
+
+
+def fit_token_budget(documents: Sequence[str], order: Sequence[int], max_documents: int,
+                     token_budget: int) -> List[int]:
+    """
+    Take candidates in `order` while they fit in `token_budget` prompt tokens.
+
+    Candidates that don't fit are skipped (a shorter one further down may still fit).
+    The first candidate is always kept so a query never ends up with no context.
+    """
+    chosen: List[int] = []
+    used = 0
+    for i in order:
+        if len(chosen) >= max_documents:
+            break
+        tokens = count_tokens(documents[i])
+        if chosen and used + tokens > token_budget:
+            continue
+        chosen.append(i)
+        used += tokens
+    return chosen
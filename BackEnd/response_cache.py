@@ -0,0 +1,135 @@
+"""
+Semantic Response Cache for TutorApp
+Serves stored answers for near-identical questions that retrieved the same document chunks.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticResponseCache:
+    """
+    Size-bounded LRU cache of model answers keyed on (query embedding, retrieved chunk IDs).
+
+    A lookup hits when an entry retrieved exactly the same set of chunk IDs and its query
+    embedding has cosine similarity >= `threshold` with the new query. Requiring the same
+    chunks means a stored answer is only reused when the context given to the model is
+    unchanged; clear() drops everything when new material is uploaded.
+    """
+
+    def __init__(self,
+                 max_entries: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+                 threshold: float = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95"))):
+        self.max_entries = max_entries
+        self.threshold = threshold
+
+        # entry_id -> {"chunk_key", "embedding", "answer", "model_seconds"}
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        # chunk_key -> set of entry_ids sharing that retrieved context
+        self._by_chunks: Dict[Tuple[str, ...], set] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_model_seconds = 0.0
+
+    @staticmethod
+    def _chunk_key(chunk_ids: Iterable[str]) -> Tuple[str, ...]:
+        return tuple(sorted(set(chunk_ids)))
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _drop(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        group = self._by_chunks.get(entry['chunk_key'])
+        if group is not None:
+            group.discard(entry_id)
+            if not group:
+                del self._by_chunks[entry['chunk_key']]
+
+    def lookup(self, embedding, chunk_ids: Iterable[str]) -> Optional[str]:
+        """Return a cached answer for a similar question with the same retrieved chunks, or None.
+
+        Results retrieved without a query embedding (lexical fast path) are never cached.
+        """
+        if embedding is None:
+            return None
+        key = self._chunk_key(chunk_ids)
+        query = self._normalize(embedding)
+        with self._lock:
+            candidates = list(self._by_chunks.get(key, ()))
+            if candidates:
+                matrix = np.stack([self._entries[c]['embedding'] for c in candidates])
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry_id = candidates[best]
+                    entry = self._entries[entry_id]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    self.saved_model_seconds += entry['model_seconds']
+                    return entry['answer']
+            self.misses += 1
+            return None
+
+    def store(self, embedding, chunk_ids: Iterable[str], answer: str, model_seconds: float = 0.0) -> None:
+        """Cache an answer together with how long the model took to produce it."""
+        if embedding is None:
+            return
+        key = self._chunk_key(chunk_ids)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                'chunk_key': key,
+                'embedding': self._normalize(embedding),
+                'answer': answer,
+                'model_seconds': model_seconds
+            }
+            self._by_chunks.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def warm(self, entries: Iterable[Tuple[np.ndarray, Iterable[str], str, float]]) -> int:
+        """Load (embedding, chunk_ids, answer, model_seconds) entries, e.g. from the result store.
+
+        Returns:
+            Number of entries loaded
+        """
+        loaded = 0
+        for embedding, chunk_ids, answer, model_seconds in entries:
+            self.store(embedding, chunk_ids, answer, model_seconds)
+            loaded += 1
+        return loaded
+
+    def clear(self) -> None:
+        """Invalidate every cached answer (called when new material is uploaded)."""
+        with self._lock:
+            self._entries.clear()
+            self._by_chunks.clear()
+
+    def stats(self) -> Dict:
+        """Return hit rate, saved model time and occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'saved_model_seconds': round(self.saved_model_seconds, 3),
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'similarity_threshold': self.threshold
+            }
@@ -0,0 +1,180 @@
+"""
+Result Store for TutorApp
+SQLite store for generated quizzes and cached answers, so a restarted process can serve them without calling the model.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# SQLite file holding quizzes and answers; set to an empty value to keep everything in memory only
+RESULT_STORE_PATH = os.getenv(
+    "RESULT_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "result_store.db")
+)
+# Also persist semantic response cache entries (quizzes are always persisted when the store is enabled)
+RESULT_STORE_ANSWERS = os.getenv("RESULT_STORE_ANSWERS", "true").lower() in ("1", "true", "yes")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quizzes (
+    source TEXT NOT NULL,
+    version TEXT NOT NULL,
+    questions TEXT NOT NULL,
+    requested INTEGER NOT NULL DEFAULT 20,
+    used_docs INTEGER NOT NULL,
+    generated_at REAL NOT NULL,
+    PRIMARY KEY (source, version)
+);
+CREATE TABLE IF NOT EXISTS answers (
+    corpus_version TEXT NOT NULL,
+    chunk_ids TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    answer TEXT NOT NULL,
+    model_seconds REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_by_version ON answers (corpus_version, created_at);
+"""
+
+
+class ResultStore:
+    """
+    On-disk store of model outputs, indexed by the corpus version they were produced for.
+
+    Quizzes are keyed by (source, source version) where the version is the hash of the
+    source's chunk IDs (see quiz_engine.version_of), so a stored quiz is valid exactly as
+    long as the source's content is unchanged. Answers are tagged with the corpus version
+    and only reloaded while the corpus is unchanged. All methods are blocking; call them
+    via run_blocking.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets several processes on the same host read while one writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(quizzes)")}
+        if "requested" not in columns:
+            # Stores from before per-source sizing asked every source for 20 questions
+            self._conn.execute("ALTER TABLE quizzes ADD COLUMN requested INTEGER NOT NULL DEFAULT 20")
+        self._lock = threading.Lock()
+        self.quiz_reads = 0
+        self.quiz_writes = 0
+        self.answer_writes = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["ResultStore"]:
+        """Open the store at RESULT_STORE_PATH, or return None if it is disabled or can't be opened."""
+        if not RESULT_STORE_PATH:
+            return None
+        try:
+            store = cls(RESULT_STORE_PATH)
+            print(f"[result-store] using {RESULT_STORE_PATH}")
+            return store
+        except Exception as e:
+            print(f"[result-store] unavailable, results will not survive restarts: {e}")
+            return None
+
+    def load_quizzes(self, versions: Dict[str, str]) -> Dict[str, Dict]:
+        """
+        Return stored quizzes for the given {source: version} pairs.
+
+        Returns:
+            {source: {"version", "questions", "requested", "used_docs", "generated_at"}} for the pairs found
+        """
+        found: Dict[str, Dict] = {}
+        with self._lock:
+            for source, version in versions.items():
+                row = self._conn.execute(
+                    "SELECT questions, requested, used_docs, generated_at FROM quizzes WHERE source = ? AND version = ?",
+                    (source, version)
+                ).fetchone()
+                if row:
+                    found[source] = {
+                        "version": version,
+                        "questions": json.loads(row[0]),
+                        "requested": row[1],
+                        "used_docs": row[2],
+                        "generated_at": row[3]
+                    }
+            self.quiz_reads += len(found)
+        return found
+
+    def save_quiz(self, source: str, entry: Dict) -> None:
+        """Store a source's quiz, replacing quizzes for its older versions."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM quizzes WHERE source = ? AND version != ?", (source, entry["version"]))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO quizzes (source, version, questions, requested, used_docs, generated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (source, entry["version"], json.dumps(entry["questions"]), entry["requested"], entry["used_docs"],
+                 entry["generated_at"])
+            )
+            self.quiz_writes += 1
+
+    def prune_quizzes(self, sources: Iterable[str]) -> None:
+        """Delete quizzes for every source not in `sources` (documents no longer in the corpus)."""
+        keep = list(sources)
+        with self._lock, self._conn:
+            placeholders = ",".join("?" * len(keep))
+            self._conn.execute(f"DELETE FROM quizzes WHERE source NOT IN ({placeholders})", keep)
+
+    def load_answers(self, corpus_version: str, limit: int) -> List[Tuple[np.ndarray, List[str], str, float]]:
+        """
+        Return up to `limit` of the newest answers stored for `corpus_version`, oldest first.
+
+        Answers for other corpus versions, and older answers beyond `limit`, are deleted.
+
+        Returns:
+            List of (embedding, chunk_ids, answer, model_seconds)
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM answers WHERE corpus_version != ?", (corpus_version,))
+            self._conn.execute(
+                "DELETE FROM answers WHERE rowid NOT IN (SELECT rowid FROM answers ORDER BY created_at DESC LIMIT ?)",
+                (limit,)
+            )
+            rows = self._conn.execute(
+                "SELECT embedding, chunk_ids, answer, model_seconds FROM answers ORDER BY created_at"
+            ).fetchall()
+        return [
+            (np.frombuffer(blob, dtype=np.float32), json.loads(chunk_ids), answer, model_seconds)
+            for blob, chunk_ids, answer, model_seconds in rows
+        ]
+
+    def save_answer(self, corpus_version: str, embedding, chunk_ids: Iterable[str], answer: str,
+                    model_seconds: float) -> None:
+        """Store a cached answer under the corpus version it was produced for."""
+        blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO answers (corpus_version, chunk_ids, embedding, answer, model_seconds, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (corpus_version, json.dumps(sorted(set(chunk_ids))), blob, answer, model_seconds, time.time())
+            )
+            self.answer_writes += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            quizzes = self._conn.execute("SELECT COUNT(*) FROM quizzes").fetchone()[0]
+            answers = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return {
+            "path": self.path,
+            "quizzes": quizzes,
+            "answers": answers,
+            "quiz_reads": self.quiz_reads,
+            "quiz_writes": self.quiz_writes,
+            "answer_writes": self.answer_writes
+        }
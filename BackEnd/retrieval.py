@@ -0,0 +1,150 @@
+"""
+Document retrieval for TutorApp
+Combines BM25 lexical search with vector search, then diversifies and budgets the chunks sent to the model.
+"""
+
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .embeddings import embed_query
+from .lexical_index import LexicalIndex, tokenize
+from .rerank import fit_token_budget, mmr_select, rerank_scores
+from .tokens import truncate_to_tokens
+
+# Reciprocal rank fusion constant (higher values flatten the rank weighting)
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Candidates fetched from each retriever before fusion, reranking and diversification
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+# Prompt tokens available for retrieved chunks
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "1200"))
+# Lexical fast path: skip vector search when the top BM25 hit contains every query term
+# and outscores the runner-up by this factor (0 disables the fast path)
+LEXICAL_FAST_PATH_MARGIN = float(os.getenv("LEXICAL_FAST_PATH_MARGIN", "1.5"))
+
+
+class RetrievalResult(NamedTuple):
+    """Cleaned chunks returned for a query, their IDs, and the query embedding used.
+
+    query_embedding is None when the lexical fast path answered without embedding the query.
+    """
+    documents: List[str]
+    ids: List[str]
+    query_embedding: Optional[np.ndarray]
+
+
+def clean_chunk(text: str) -> str:
+    """Normalize whitespace and underscore runs in a retrieved chunk."""
+    txt = re.sub(r"_+", " ", text)
+    return re.sub(r"\s{2,}", " ", txt).strip()
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> Dict[str, float]:
+    """Merge ranked ID lists: each list contributes 1 / (k + rank) to an ID's score.
+
+    Returns:
+        {id: fused score}, ordered from best to worst
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return dict(sorted(scores.items(), key=lambda item: item[1], reverse=True))
+
+
+def _is_confident(hits, query: str) -> bool:
+    if LEXICAL_FAST_PATH_MARGIN <= 0 or not hits:
+        return False
+    if hits[0].matched_terms < len(set(tokenize(query))):
+        return False
+    return len(hits) == 1 or hits[0].score >= LEXICAL_FAST_PATH_MARGIN * hits[1].score
+
+
+def _vector_search(collection, embedding: np.ndarray, n_results: int) -> Dict[str, Tuple[str, np.ndarray]]:
+    """Return {id: (document, embedding)} for the nearest chunks, best first."""
+    results = collection.query(
+        query_embeddings=[embedding.tolist()],
+        n_results=n_results,
+        include=["documents", "embeddings"]
+    )
+    found: Dict[str, Tuple[str, np.ndarray]] = {}
+    if results and results.get('documents') and results['documents'][0]:
+        for chunk_id, doc, vector in zip(results['ids'][0], results['documents'][0], results['embeddings'][0]):
+            if doc:
+                found[chunk_id] = (doc, np.asarray(vector, dtype=np.float32))
+    return found
+
+
+def _fetch_embeddings(collection, ids: List[str]) -> Dict[str, Tuple[str, np.ndarray]]:
+    """Load documents and embeddings for lexical candidates the vector search did not return."""
+    if not ids:
+        return {}
+    results = collection.get(ids=ids, include=["documents", "embeddings"])
+    return {
+        chunk_id: (doc, np.asarray(vector, dtype=np.float32))
+        for chunk_id, doc, vector in zip(results['ids'], results['documents'], results['embeddings'])
+        if doc
+    }
+
+
+def _budgeted(ids: List[str], documents: List[str], order: List[int], n_results: int) -> Tuple[List[str], List[str]]:
+    """Apply the prompt token budget to candidates taken in `order`."""
+    chosen = fit_token_budget(documents, order, n_results, RETRIEVAL_TOKEN_BUDGET)
+    docs = [documents[i] for i in chosen]
+    if docs:
+        # A single oversized chunk is shortened rather than dropped
+        docs[0] = truncate_to_tokens(docs[0], RETRIEVAL_TOKEN_BUDGET)
+    return docs, [ids[i] for i in chosen]
+
+
+def retrieve(collection, text: str, n_results: int = 5, index: Optional[LexicalIndex] = None) -> RetrievalResult:
+    """
+    Find the chunks most relevant to `text` (blocking; run it via run_blocking).
+
+    Pipeline:
+      1. Over-fetch RETRIEVAL_CANDIDATES candidates from vector search and, when a ready
+         lexical `index` is given, from BM25; merge them with reciprocal rank fusion.
+      2. Rescore with the optional cross-encoder (RERANKER_MODEL).
+      3. Order with maximal marginal relevance over the candidate embeddings so
+         near-duplicate chunks don't crowd out other relevant material.
+      4. Keep at most `n_results` chunks that fit in RETRIEVAL_TOKEN_BUDGET tokens.
+
+    When the top BM25 hit is a clear winner, the BM25 ranking is used directly and the
+    query is never embedded. Otherwise the query is embedded locally and sent with
+    query_embeddings=, so the embedding can be reused by callers (e.g. the semantic
+    response cache).
+    """
+    candidates = max(n_results, RETRIEVAL_CANDIDATES)
+    hits = []
+    if index is not None and index.ready:
+        hits = index.search(text, limit=candidates)
+        if _is_confident(hits, text):
+            ids: List[str] = []
+            documents: List[str] = []
+            for hit in hits:
+                doc = index.document(hit.id)
+                if doc and clean_chunk(doc) not in documents:
+                    ids.append(hit.id)
+                    documents.append(clean_chunk(doc))
+            documents, ids = _budgeted(ids, documents, list(range(len(ids))), n_results)
+            return RetrievalResult(documents, ids, None)
+
+    embedding = embed_query(text)
+    found = _vector_search(collection, embedding, candidates)
+    fused = reciprocal_rank_fusion([list(found), [h.id for h in hits]])
+    found.update(_fetch_embeddings(collection, [chunk_id for chunk_id in fused if chunk_id not in found]))
+
+    ids = [chunk_id for chunk_id in fused if chunk_id in found]
+    if not ids:
+        return RetrievalResult([], [], embedding)
+    documents = [clean_chunk(found[chunk_id][0]) for chunk_id in ids]
+
+    relevance = rerank_scores(text, documents)
+    if relevance is None:
+        relevance = np.array([fused[chunk_id] for chunk_id in ids], dtype=np.float32)
+    order = mmr_select(np.stack([found[chunk_id][1] for chunk_id in ids]), relevance, k=len(ids))
+
+    documents, ids = _budgeted(ids, documents, order, n_results)
+    return RetrievalResult(documents, ids, embedding)
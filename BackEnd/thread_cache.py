@@ -0,0 +1,132 @@
+"""
+Thread History Cache for TutorApp
+In-process LRU cache of recent chat messages per thread, with a memory cap and TTL eviction.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Rough per-message overhead (dict + metadata strings) added to the content length
+_MESSAGE_OVERHEAD_BYTES = 200
+
+
+class ThreadHistoryCache:
+    """
+    LRU cache keyed by thread_id holding the most recent messages of hot threads.
+
+    Each entry keeps at most `max_messages` messages (the tail of the thread) and a
+    `complete` flag telling whether the tail reaches back to the first message.
+    Entries are evicted least-recently-used first when the thread count or byte cap
+    is exceeded, and expire `ttl_seconds` after they were loaded.
+    """
+
+    def __init__(self,
+                 max_threads: int = int(os.getenv("THREAD_CACHE_MAX_THREADS", "256")),
+                 max_bytes: int = int(os.getenv("THREAD_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+                 ttl_seconds: float = float(os.getenv("THREAD_CACHE_TTL", "900")),
+                 max_messages: int = int(os.getenv("THREAD_CACHE_MESSAGES", "50"))):
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size_of(messages: List[Dict]) -> int:
+        return sum(len(m.get('content') or "") + _MESSAGE_OVERHEAD_BYTES for m in messages)
+
+    def _drop(self, thread_id: str) -> None:
+        entry = self._entries.pop(thread_id, None)
+        if entry is not None:
+            self._bytes -= entry['bytes']
+
+    def _evict_over_capacity(self) -> None:
+        while self._entries and (len(self._entries) > self.max_threads or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def get(self, thread_id: str) -> Optional[Tuple[List[Dict], bool]]:
+        """
+        Return (messages, complete) for a cached thread, or None on a miss.
+
+        The returned list is a copy and may be sliced freely by the caller.
+        """
+        with self._lock:
+            entry = self._entries.get(thread_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.monotonic() >= entry['expires_at']:
+                self._drop(thread_id)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(thread_id)
+            self.hits += 1
+            return list(entry['messages']), entry['complete']
+
+    def put(self, thread_id: str, messages: List[Dict], complete: bool) -> None:
+        """Store the tail of a thread loaded from the database."""
+        if len(messages) > self.max_messages:
+            messages = messages[-self.max_messages:]
+            complete = False
+        with self._lock:
+            self._drop(thread_id)
+            size = self._size_of(messages)
+            self._entries[thread_id] = {
+                'messages': list(messages),
+                'complete': complete,
+                'bytes': size,
+                'expires_at': time.monotonic() + self.ttl_seconds
+            }
+            self._bytes += size
+            self._evict_over_capacity()
+
+    def append(self, thread_id: str, message: Dict) -> None:
+        """Write-through for a newly stored message; only updates threads already cached."""
+        with self._lock:
+            entry = self._entries.get(thread_id)
+            if entry is None:
+                return
+            entry['messages'].append(message)
+            entry['bytes'] += self._size_of([message])
+            self._bytes += self._size_of([message])
+            if len(entry['messages']) > self.max_messages:
+                removed = entry['messages'].pop(0)
+                entry['bytes'] -= self._size_of([removed])
+                self._bytes -= self._size_of([removed])
+                entry['complete'] = False
+            self._entries.move_to_end(thread_id)
+            self._evict_over_capacity()
+
+    def invalidate(self, thread_id: str) -> None:
+        """Remove a thread from the cache (e.g. when it is deleted)."""
+        with self._lock:
+            self._drop(thread_id)
+
+    def stats(self) -> Dict:
+        """Return hit/miss/eviction counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'threads': len(self._entries),
+                'bytes': self._bytes,
+                'max_threads': self.max_threads,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds
+            }
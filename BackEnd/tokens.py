@@ -0,0 +1,8 @@
+"""
+Token counting for TutorApp
+Re-exports the counter in AICalls/tokens.py so prompts and backend budgets agree on token counts.
+"""
+
+from AICalls.tokens import count_tokens, truncate_to_tokens
+
+__all__ = ["count_tokens", "truncate_to_tokens"]
@@ -4,6 +4,12 @@ import axios from 'axios';
 import './Chat.css';
 import './FileUpload.css';
 
+// Upload job polling: one status check per second, giving up after 10 minutes
+// or after several consecutive failed checks
+const UPLOAD_POLL_INTERVAL_MS = 1000;
+const UPLOAD_MAX_POLLS = 600;
+const UPLOAD_MAX_POLL_ERRORS = 5;
+
 const Chat = ({ onSwitchToQuiz }) => {
     const [messages, setMessages] = useState([
         { sender: 'bot', text: 'Hello! How can I assist you today? You can upload study materials and I\'ll help you understand them.' },
@@ -140,6 +146,30 @@ const Chat = ({ onSwitchToQuiz }) => {
         }
     };
 
+    const waitForUploadJob = async (jobId) => {
+        let consecutiveErrors = 0;
+        for (let attempt = 0; attempt < UPLOAD_MAX_POLLS; attempt++) {
+            try {
+                const status = await axios.get(`http://127.0.0.1:8000/api/upload/${jobId}`);
+                consecutiveErrors = 0;
+                if (status.data.status === 'completed' || status.data.status === 'failed') {
+                    return status.data;
+                }
+            } catch (err) {
+                // Jobs live in server memory, so a restart forgets them
+                if (err.response?.status === 404) {
+                    throw new Error('The server lost track of this upload (it may have restarted). Please upload the file again.');
+                }
+                consecutiveErrors += 1;
+                if (consecutiveErrors >= UPLOAD_MAX_POLL_ERRORS) {
+                    throw err;
+                }
+            }
+            await new Promise(resolve => setTimeout(resolve, UPLOAD_POLL_INTERVAL_MS));
+        }
+        throw new Error('Processing is taking too long. Please check back later or try uploading again.');
+    };
+
     const handleFileUpload = async () => {
         if (!selectedFile) return;
 
@@ -173,9 +203,15 @@ const Chat = ({ onSwitchToQuiz }) => {
                 timeout: 30000, // 30 second timeout
             });
 
+            // The server processes the file in the background; poll the job until it finishes
+            const job = await waitForUploadJob(response.data.job_id);
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Processing failed');
+            }
+
             setMessages(prev => [...prev, {
                 sender: 'bot',
-                text: `✅ Successfully uploaded and processed ${selectedFile.name}. ${response.data.chunks} chunks were created.`
+                text: `✅ Successfully uploaded and processed ${selectedFile.name}. ${job.chunks_stored} chunks were created.`
             }]);
 
             // Refresh document count
@@ -123,22 +123,61 @@ const Quiz = ({ externalRegenerateTrigger, onRegenerationComplete }) => {
         }
     };
 
+    // Parse one Server-Sent Events frame ("event: ...\ndata: {...}") into { event, data }
+    const parseSseFrame = (frame) => {
+        let event = 'message';
+        let data = '';
+        frame.split('\n').forEach((line) => {
+            if (line.startsWith('event:')) {
+                event = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                data += line.slice(5).trim();
+            }
+        });
+        return { event, data: data ? JSON.parse(data) : null };
+    };
+
     const generateQuiz = async () => {
         setIsLoading(true);
         setError(null);
+        setParsedQuestions([]);
+        setShowAnswers({});
         try {
-            const response = await axios.post('http://127.0.0.1:8000/api/quiz/generate/');
-            const quizData = response.data.quiz;
-            handleQuizPayload(quizData);
+            // Questions arrive one at a time; show each as soon as it is ready
+            const response = await fetch('http://127.0.0.1:8000/api/quiz/generate/stream', { method: 'POST' });
+            if (!response.ok) {
+                const body = await response.json().catch(() => ({}));
+                throw new Error(body.detail || `Quiz generation failed (${response.status})`);
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let finished = false;
+            while (!finished) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const frames = buffer.split('\n\n');
+                buffer = frames.pop();
+                for (const frame of frames) {
+                    const { event, data } = parseSseFrame(frame);
+                    if (event === 'error') {
+                        throw new Error(data?.detail || 'Quiz generation failed');
+                    }
+                    if (event === 'done') {
+                        finished = true;
+                        break;
+                    }
+                    if (data) {
+                        setParsedQuestions(prev => [...prev, { question: data.question, answer: data.answer }]);
+                        setIsLoading(false);
+                    }
+                }
+            }
         } catch (err) {
             console.error('Error generating quiz:', err);
-            let errorMessage = 'Failed to generate quiz. Please try again.';
-            if (err.response?.data?.detail) {
-                errorMessage = err.response.data.detail;
-            } else if (err.message) {
-                errorMessage = err.message;
-            }
-            setError(errorMessage);
+            setError(err.message || 'Failed to generate quiz. Please try again.');
         } finally {
             setIsLoading(false);
         }